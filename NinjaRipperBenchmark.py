@@ -0,0 +1,265 @@
+# Synthetic RIP files and per-stage timings of the importer.
+# Runs without Maya: the Maya build step uses stub maya modules.
+#
+# Usage:
+#   python NinjaRipperBenchmark.py [--vertexes N] [--faces N]
+#                                  [--layout basic|svposition|wide]
+#                                  [--repeat N] [--keep DIR]
+import argparse
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import types
+import numpy
+import NinjaRipperCore as core
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2: no peak memory.
+    tracemalloc = None
+
+# Attribute declarations: [semantic, semantic index, type string].
+# 'wide' puts position/UV behind unused attributes at odd dword offsets.
+Layouts = {
+    'basic': [
+        ['POSITION', 0, 'fff'], ['NORMAL', 0, 'fff'], ['TEXCOORD', 0, 'ff'],
+    ],
+    'svposition': [
+        ['SV_POSITION', 0, 'ffff'], ['TEXCOORD', 0, 'ff'],
+    ],
+    'wide': [
+        ['TANGENT', 0, 'ffff'], ['BLENDINDICES', 0, 'L'],
+        ['POSITION', 0, 'fff'], ['BLENDWEIGHT', 0, 'ffff'],
+        ['NORMAL', 0, 'fff'], ['COLOR', 0, 'L'], ['TEXCOORD', 0, 'ff'],
+        ['TEXCOORD', 1, 'ff'], ['BINORMAL', 0, 'fff'],
+    ],
+}
+
+
+def makeSyntheticRip(path, vertexes, faces, layout='basic',
+                     textures=("Texture_0.dds", "Texture_1.dds"),
+                     shaders=("Shader_0.vs", "Shader_0.ps"), seed=0):
+    random = numpy.random.RandomState(seed)
+    typeCodes = {'f': 0, 'L': 1, 'l': 2}
+
+    attributes = []
+    vertDict = ''
+    for semantic, index, typeString in Layouts[layout]:
+        attributes.append([
+            semantic, index, len(vertDict) * 4,
+            [typeCodes[t] for t in typeString]
+        ])
+        vertDict += typeString
+
+    vertexData = numpy.zeros(vertexes, dtype=core.makeVertexDtype(vertDict))
+    for i, t in enumerate(vertDict):
+        field = 'f{}'.format(i)
+        if t == 'f':
+            vertexData[field] = random.uniform(-1, 1, vertexes)
+        else:
+            vertexData[field] = random.randint(0, 255, vertexes)
+
+    indexes = random.randint(0, max(vertexes, 1), faces * 3)
+    core.writeRIPFile(
+        path, indexes, vertexData, attributes, textures, shaders
+    )
+
+
+def installMayaStubs():
+    # Just enough of maya.cmds/OpenMaya/mel for the import code to run.
+    # Array types keep the data they get, MFnMesh does nothing.
+    class MScriptUtil(object):
+        def createFromList(self, values, count):
+            self.values = values
+
+        def asIntPtr(self):
+            return self.values
+
+        asFloatPtr = asFloat3Ptr = asFloat4Ptr = asIntPtr
+
+    class MArray(list):
+        def __init__(self, *args):
+            if len(args) == 2 and isinstance(args[0], list):
+                list.__init__(self, args[0])  # (pointer, count)
+            elif len(args) == 2:
+                list.__init__(self, [args[1]] * int(args[0]))
+            else:
+                list.__init__(self)
+
+        def length(self):
+            return len(self)
+
+    class MPlug(object):
+        def setBool(self, value):
+            pass
+
+    class MFnMesh(object):
+        def create(self, *args):
+            return None
+
+        def findPlug(self, name):
+            return MPlug()
+
+        def __getattr__(self, name):
+            return lambda *args: None
+
+    class MDagPath(object):
+        @staticmethod
+        def getAPathTo(node, path):
+            pass
+
+        def fullPathName(self):
+            return "|NinjaMesh"
+
+    class Commands(types.ModuleType):
+        def rename(self, node, name):
+            return name
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    openMaya = types.ModuleType('maya.OpenMaya')
+    openMaya.MScriptUtil = MScriptUtil
+    openMaya.MIntArray = openMaya.MFloatArray = MArray
+    openMaya.MFloatPointArray = openMaya.MVectorArray = MArray
+    openMaya.MColorArray = MArray
+    openMaya.MFnMesh = MFnMesh
+    openMaya.MDagPath = MDagPath
+
+    maya = types.ModuleType('maya')
+    maya.cmds = Commands('maya.cmds')
+    maya.mel = Commands('maya.mel')
+    maya.OpenMaya = openMaya
+    sys.modules.update({
+        'maya': maya, 'maya.cmds': maya.cmds, 'maya.mel': maya.mel,
+        'maya.OpenMaya': openMaya,
+    })
+
+
+def importMayaModule():
+    if 'maya' not in sys.modules:
+        installMayaStubs()
+    import NinjaRipperMayaImportTools
+    NinjaRipperMayaImportTools.initialize()
+    # Progress lines would mix with the report and count as build time.
+    NinjaRipperMayaImportTools.g_debugMessages = False
+    return NinjaRipperMayaImportTools
+
+
+def measure(function, *args):
+    # Returns (result, seconds, peak bytes allocated or None).
+    if tracemalloc is not None:
+        tracemalloc.start()
+    start = time.time()
+    result = function(*args)
+    seconds = time.time() - start
+    peak = None
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def runStages(path, maya):
+    # Returns [name, seconds, peak bytes, bytes processed] for every stage.
+    stages = []
+    layout = core.newVertexLayout()
+
+    f = core.openRIPFile(path)
+    header, seconds, peak = measure(core.readRIPHeader, f)
+    stages.append(['readRIPHeader', seconds, peak, 32])
+
+    offset = f.tell()
+    (vertDict, attributes), seconds, peak = measure(
+        core.readRIPVertexAttrib, f, header[7]
+    )
+    core.resetVertexLayout(layout)
+    core.applyRecognitionLogic(layout, attributes)
+    stages.append(['readRIPVertexAttrib', seconds, peak, f.tell() - offset])
+
+    offset = f.tell()
+    core.readRIPStrings(f, header[5] + header[6])
+    faces, seconds, peak = measure(
+        lambda: numpy.array(core.decodeRIPFaces(f, header[2]))
+    )
+    stages.append(['readRIPFaces', seconds, peak, header[2] * 12])
+
+    (positions, normals, u, v, colors), seconds, peak = measure(
+        core.decodeRIPVertexes, f, header[3], vertDict, layout
+    )
+    stages.append([
+        'readRIPVertexes', seconds, peak, header[3] * len(vertDict) * 4
+    ])
+
+    ripMesh = core.RipMesh(
+        path, header, layout, attributes, [], [], faces, positions, normals,
+        u, v, colors
+    )
+    if maya is not None:
+        _, seconds, peak = measure(maya.prepareRipMesh, ripMesh)
+        stages.append(['prepareRipMesh', seconds, peak, 0])
+        _, seconds, peak = measure(maya.createMesh, ripMesh)
+        stages.append(['createMesh (stub)', seconds, peak, 0])
+    f.close()
+    return stages
+
+
+def printReport(results, vertexes):
+    print("{:<22}{:>12}{:>12}{:>16}{:>14}".format(
+        "stage", "time, ms", "MB/s", "vertexes/s", "peak, MB"
+    ))
+    for name, seconds, peak, size in results:
+        seconds = max(seconds, 1e-9)
+        print("{:<22}{:>12.2f}{:>12}{:>16.0f}{:>14}".format(
+            name, seconds * 1000,
+            "{:.1f}".format(size / seconds / 2 ** 20) if size else "-",
+            vertexes / seconds,
+            "{:.1f}".format(peak / 2.0 ** 20) if peak is not None else "-"
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time RIP parsing stages on a synthetic file"
+    )
+    parser.add_argument('--vertexes', type=int, default=500000)
+    parser.add_argument('--faces', type=int, default=250000)
+    parser.add_argument('--layout', choices=sorted(Layouts), default='basic')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-maya', action='store_true',
+                        help="skip mesh build stages")
+    parser.add_argument('--keep', metavar='DIR',
+                        help="write the synthetic file to DIR and keep it")
+    args = parser.parse_args(argv)
+
+    directory = args.keep or tempfile.mkdtemp()
+    path = os.path.join(directory, "Synthetic_{}.rip".format(args.layout))
+    try:
+        makeSyntheticRip(path, args.vertexes, args.faces, args.layout)
+        maya = None if args.no_maya else importMayaModule()
+
+        # Best of 'repeat' runs for every stage.
+        best = None
+        for i in range(args.repeat):
+            stages = runStages(path, maya)
+            if best is None:
+                best = stages
+            for stage, current in zip(best, stages):
+                if current[1] < stage[1]:
+                    stage[:] = current
+
+        print("{}: {} vertexes, {} faces, {:.1f} MB".format(
+            os.path.basename(path), args.vertexes, args.faces,
+            os.path.getsize(path) / 2.0 ** 20
+        ))
+        printReport(best, args.vertexes)
+    finally:
+        if args.keep is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
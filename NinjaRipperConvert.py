@@ -0,0 +1,373 @@
+# Converts .rip files to binary glTF 2.0 (.glb), glTF 2.0 (.gltf + .bin) or
+# OBJ (+ .mtl) without Maya. Files are parsed, transformed and written on a
+# process pool; scale, rotation and UV scale/flip work the same way as in
+# the import window. The 'nrm' format keeps decoded, untransformed meshes
+# for a later import. Outputs keep the folder structure of the inputs below
+# their common folder, e.g. _Frame0000/Mesh_0000.glb.
+#
+# Usage:
+#   python NinjaRipperConvert.py [--format glb|gltf|obj|nrm] [--scale S]
+#                                [--rotate X Y Z] [--uv-scale S] [--flip-uv]
+#                                [--reverse-normals] [--clean]
+#                                [--texture N] [--workers N] [--all]
+#                                OUTPUT INPUT...
+# INPUT is a .rip file or a folder with .rip files.
+import argparse
+import errno
+import json
+import multiprocessing
+import os
+import os.path
+import struct
+import sys
+import numpy
+import NinjaRipperCore as core
+
+GltfFloat = 5126
+GltfUnsignedInt = 5125
+GltfArrayBuffer = 34962
+GltfElementArrayBuffer = 34963
+GltfTriangles = 4
+GlbMagic = 0x46546C67  # 'glTF'
+GlbVersion = 2
+GlbChunkJson = 0x4E4F534A
+GlbChunkBin = 0x004E4942
+
+
+def texturePath(ripMesh, index, outputDirectory):
+    # Textures stay next to the .rip files, outputs refer to them.
+    if index >= len(ripMesh.textures):
+        index = 0
+    texture = ripMesh.textureFile(index)
+    fullPath = os.path.join(os.path.dirname(ripMesh.path), texture)
+    return os.path.relpath(fullPath, outputDirectory).replace(os.sep, "/")
+
+
+def unitNormals(normals):
+    normals = normals[:, :3].astype(numpy.float32)
+    lengths = numpy.sqrt((normals * normals).sum(axis=1))
+    valid = lengths > 0
+    normals[valid] /= lengths[valid][:, None]
+    normals[~valid] = (0, 0, 1)
+    return normals
+
+
+def buildGltf(ripMesh, name, texture):
+    # Returns (glTF JSON without buffer uri, list of binary blocks). Single
+    # mesh, single primitive. Every attribute gets its own buffer view in
+    # one buffer; all of them are 4-byte types, so no padding.
+    arrays = [('POSITION', numpy.ascontiguousarray(ripMesh.positions[:, :3]),
+               "VEC3")]
+    if ripMesh.normals.shape[1] >= 3:
+        arrays.append(('NORMAL', unitNormals(ripMesh.normals), "VEC3"))
+    # glTF UV origin is top left, RipMesh V points up.
+    texCoords = numpy.empty((ripMesh.vertexCount(), 2), numpy.float32)
+    texCoords[:, 0] = ripMesh.u
+    texCoords[:, 1] = 1 - ripMesh.v
+    arrays.append(('TEXCOORD_0', texCoords, "VEC2"))
+    if ripMesh.colors is not None:
+        arrays.append(('COLOR_0', ripMesh.colors, "VEC4"))
+
+    gltf = {
+        'asset': {'version': "2.0", 'generator': "NinjaRipperConvert"},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0, 'name': name}],
+        'meshes': [{'name': name, 'primitives': [{
+            'attributes': {}, 'indices': len(arrays), 'material': 0,
+            'mode': GltfTriangles
+        }]}],
+        'materials': [{
+            'name': texture,
+            'pbrMetallicRoughness': {
+                'baseColorTexture': {'index': 0}, 'metallicFactor': 0.0
+            }
+        }],
+        'textures': [{'source': 0}],
+        'images': [{'uri': texture}],
+        'accessors': [],
+        'bufferViews': [],
+        'buffers': [],
+    }
+
+    blocks = []
+    offset = 0
+    for i, (semantic, data, accessorType) in enumerate(arrays):
+        data = numpy.ascontiguousarray(data, dtype='<f4')
+        blocks.append(data.tobytes())
+        gltf['bufferViews'].append({
+            'buffer': 0, 'byteOffset': offset,
+            'byteLength': data.nbytes, 'target': GltfArrayBuffer
+        })
+        accessor = {
+            'bufferView': i, 'componentType': GltfFloat,
+            'count': len(data), 'type': accessorType
+        }
+        if semantic == 'POSITION' and len(data):
+            accessor['min'] = [float(x) for x in data.min(axis=0)]
+            accessor['max'] = [float(x) for x in data.max(axis=0)]
+        gltf['accessors'].append(accessor)
+        gltf['meshes'][0]['primitives'][0]['attributes'][semantic] = i
+        offset += data.nbytes
+
+    faces = numpy.ascontiguousarray(ripMesh.faces, dtype='<u4')
+    blocks.append(faces.tobytes())
+    gltf['bufferViews'].append({
+        'buffer': 0, 'byteOffset': offset, 'byteLength': faces.nbytes,
+        'target': GltfElementArrayBuffer
+    })
+    gltf['accessors'].append({
+        'bufferView': len(arrays), 'componentType': GltfUnsignedInt,
+        'count': len(faces), 'type': "SCALAR"
+    })
+    offset += faces.nbytes
+
+    gltf['buffers'].append({'byteLength': offset})
+    return gltf, blocks
+
+
+def writeGltf(ripMesh, path, texture):
+    name = os.path.splitext(os.path.basename(path))[0]
+    binName = name + ".bin"
+    gltf, blocks = buildGltf(ripMesh, name, texture)
+    gltf['buffers'][0]['uri'] = binName
+    with open(os.path.join(os.path.dirname(path), binName), "wb") as f:
+        for block in blocks:
+            f.write(block)
+    with open(path, "w") as f:
+        json.dump(gltf, f, indent=1, sort_keys=True)
+
+
+def writeGlb(ripMesh, path, texture):
+    # Binary glTF: 12-byte header, JSON chunk padded with spaces, BIN chunk
+    # padded with zeros, both to 4 bytes.
+    name = os.path.splitext(os.path.basename(path))[0]
+    gltf, blocks = buildGltf(ripMesh, name, texture)
+    jsonChunk = json.dumps(gltf, sort_keys=True).encode('utf-8')
+    jsonChunk += b" " * (-len(jsonChunk) % 4)
+    binSize = gltf['buffers'][0]['byteLength']
+    binPadding = -binSize % 4
+    with open(path, "wb") as f:
+        f.write(struct.pack(
+            '<LLL', GlbMagic, GlbVersion,
+            12 + 8 + len(jsonChunk) + 8 + binSize + binPadding
+        ))
+        f.write(struct.pack('<LL', len(jsonChunk), GlbChunkJson))
+        f.write(jsonChunk)
+        f.write(struct.pack('<LL', binSize + binPadding, GlbChunkBin))
+        for block in blocks:
+            f.write(block)
+        f.write(b"\0" * binPadding)
+
+
+def writeObj(ripMesh, path, texture):
+    # OBJ and RipMesh share the UV origin (bottom left). Vertex colors have
+    # no standard OBJ form and are not written.
+    name = os.path.splitext(os.path.basename(path))[0]
+    mtlName = name + ".mtl"
+    hasNormals = ripMesh.normals.shape[1] >= 3
+
+    with open(os.path.join(os.path.dirname(path), mtlName), "w") as f:
+        f.write("newmtl {}\nKd 1 1 1\nmap_Kd {}\n".format(name, texture))
+
+    with open(path, "w") as f:
+        f.write("mtllib {}\no {}\n".format(mtlName, name))
+        numpy.savetxt(f, ripMesh.positions[:, :3], fmt="v %.6f %.6f %.6f")
+        numpy.savetxt(
+            f, numpy.column_stack([ripMesh.u, ripMesh.v]), fmt="vt %.6f %.6f"
+        )
+        if hasNormals:
+            numpy.savetxt(
+                f, unitNormals(ripMesh.normals), fmt="vn %.6f %.6f %.6f"
+            )
+        f.write("usemtl {}\n".format(name))
+
+        # Same index for position/UV/normal: v/vt/vn per face vertex.
+        faces = ripMesh.faces.reshape(-1, 3).astype(numpy.int64) + 1
+        corner = "%d/%d/%d" if hasNormals else "%d/%d"
+        numpy.savetxt(
+            f, faces.repeat(corner.count('%'), axis=1),
+            fmt="f " + " ".join([corner] * 3)
+        )
+
+
+def makeDirectory(directory):
+    # Several workers may create the same folder at once.
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def convertRipFile(task):
+    # Returns (path, output path or None, message or None). Runs in a pool
+    # worker, so errors are returned instead of raised. 'outputName' is the
+    # output path without extension.
+    path, outputName, options = task
+    outputDirectory = os.path.dirname(outputName)
+    try:
+        ripMesh = core.readRIPFile(path)
+        makeDirectory(outputDirectory)
+    except (core.RipFormatError, EnvironmentError) as e:
+        return path, None, str(e)
+
+    if not ripMesh.isComplete() or not (
+        ripMesh.is3DModel() or options['importAnything']
+    ):
+        return path, None, "not a complete 3D mesh, skipped"
+
+    if options['clean']:
+        core.cleanRipMesh(ripMesh)
+
+    if options['format'] == 'nrm':
+        # Import options are applied when the mesh file is imported.
+        outputPath = outputName + core.MeshFileExtension
+        ripMesh.textures = [
+            texturePath(ripMesh, i, outputDirectory)
+            for i in range(len(ripMesh.textures))
+        ]
+        try:
+            core.writeRipMeshFile(outputPath, ripMesh)
+        except EnvironmentError as e:
+            return path, None, str(e)
+        return path, outputPath, None
+
+    core.transformRipMesh(
+        ripMesh, options['scale'], options['rotation'], options['uvScale'],
+        options['uvScale'] * (-1 if options['flipUV'] else 1)
+    )
+    if options['reverseNormals']:
+        core.reverseWinding(ripMesh)
+
+    outputPath = "{}.{}".format(outputName, options['format'])
+    texture = texturePath(ripMesh, options['texture'], outputDirectory)
+    writers = {'glb': writeGlb, 'gltf': writeGltf, 'obj': writeObj}
+    try:
+        writers[options['format']](ripMesh, outputPath, texture)
+    except EnvironmentError as e:
+        return path, None, str(e)
+    return path, outputPath, None
+
+
+def findRipFiles(inputs):
+    # Folders are searched with their subfolders (_Frame*, _Forced*).
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(core.findRIPFiles(path))
+        else:
+            paths.append(path)
+    return paths
+
+
+def outputNames(paths, outputDirectory):
+    # Output path without extension of every input: its path below the
+    # common folder of all inputs, so Mesh_0000.rip of two _Frame folders
+    # gets two outputs.
+    directories = [
+        os.path.dirname(os.path.abspath(path)).split(os.sep)
+        for path in paths
+    ]
+    base = os.sep.join(os.path.commonprefix(directories)) + os.sep
+    return [
+        os.path.join(
+            outputDirectory,
+            os.path.splitext(os.path.relpath(os.path.abspath(path), base))[0]
+        )
+        for path in paths
+    ]
+
+
+def findCollisions(paths, names):
+    # Returns [(path, other path)] of inputs that map to the same output.
+    seen = {}
+    collisions = []
+    for path, name in zip(paths, names):
+        key = os.path.normcase(name)
+        if key in seen:
+            collisions.append((seen[key], path))
+        else:
+            seen[key] = path
+    return collisions
+
+
+def convertRipFiles(paths, outputNames, options, workers=0):
+    # Yields convertRipFile() results in the order of 'paths'.
+    tasks = [
+        (path, name, options) for path, name in zip(paths, outputNames)
+    ]
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield convertRipFile(task)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap(convertRipFile, tasks, chunksize=4):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert .rip files to glTF or OBJ"
+    )
+    parser.add_argument('output', help="output folder")
+    parser.add_argument('inputs', nargs='+', metavar='input',
+                        help=".rip file or folder with .rip files")
+    parser.add_argument('--format', choices=['glb', 'gltf', 'obj', 'nrm'],
+                        default='glb')
+    parser.add_argument('--scale', type=float, default=100.0)
+    parser.add_argument('--rotate', type=float, nargs=3, default=[90, 0, 0],
+                        metavar=('X', 'Y', 'Z'))
+    parser.add_argument('--uv-scale', type=float, default=1.0)
+    parser.add_argument('--flip-uv', action='store_true')
+    parser.add_argument('--reverse-normals', action='store_true')
+    parser.add_argument('--clean', action='store_true',
+                        help="drop degenerate faces and unused vertexes")
+    parser.add_argument('--texture', type=int, default=0,
+                        help="texture number used as color map")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="worker processes, 0 - CPU count")
+    parser.add_argument('--all', action='store_true',
+                        help="do not skip non-3D objects")
+    args = parser.parse_args(argv)
+
+    options = {
+        'format': args.format, 'scale': args.scale,
+        'rotation': tuple(args.rotate), 'uvScale': args.uv_scale,
+        'flipUV': args.flip_uv, 'reverseNormals': args.reverse_normals,
+        'texture': args.texture, 'importAnything': args.all,
+        'clean': args.clean,
+    }
+
+    paths = findRipFiles(args.inputs)
+    # The header catalog drops files that are known not to be meshes
+    # before any worker starts.
+    paths = core.filterRIPFiles(paths, importAnything=args.all)
+    names = outputNames(paths, args.output)
+    collisions = findCollisions(paths, names)
+    for path, other in collisions:
+        print("{}: same output as {}".format(other, path))
+    if collisions:
+        return 2
+
+    converted = 0
+    for path, outputPath, message in convertRipFiles(
+        paths, names, options, args.workers
+    ):
+        if outputPath is None:
+            print("{}: {}".format(path, message))
+        else:
+            converted += 1
+            print("{} -> {}".format(path, outputPath))
+    print("Converted {} of {} file(s)".format(converted, len(paths)))
+    return 0 if converted == len(paths) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1315 @@
+# Maya independent part of NinjaRipperMayaImportTools: RIP v4 file parsing.
+# Only standard library and NumPy are used here, so this module can be used
+# (and profiled) outside of Maya.
+import collections
+import hashlib
+import itertools
+import json
+import math
+import mmap
+import multiprocessing
+import multiprocessing.pool
+import os
+import os.path
+import struct
+import tempfile
+import threading
+import timeit
+import numpy
+
+RipSignature = 0xDEADC0DE
+RipFileVersion = 4
+
+DefaultTextureFile = "setka.png"
+CatalogFileName = "NinjaRipperCatalog.json"
+CatalogVersion = 1
+StringChunkSize = 64
+# Decoded mesh files (.nrm): see writeRipMesh().
+MeshFileSignature = b"NRMF"
+MeshFileVersion = 1
+MeshFileExtension = ".nrm"
+MeshFileAlignment = 16
+VertexChunkSize = 65536  # Vertexes decoded at a time.
+
+
+def newVertexLayout(autoMode=True):
+    return {
+        'pos': [0, 1, 2, 3],  # Can be 2 of 4
+        'nml': [4, 5, 6, 7],
+        'uvw': [8, 9, 10, 11],  # Can be only 1 of 3. Met 4, but not in use.
+        'clr': [12, 13, 14, 15],  # 1 packed RGBA8 or 3-4 floats.
+        'posUpdated': False,
+        'nmlUpdated': False,
+        'uvwUpdated': False,
+        'clrUpdated': False,
+        'autoMode': autoMode,
+        'posCount': 0,
+        'nmlCount': 0,
+        'uvwCount': 0,
+        'clrCount': 0,
+        'ignore': [],  # 'nml'/'clr' left out of decoding, e.g. not imported.
+    }
+
+
+class ResolvedLayout(dict):
+    # Vertex layout of a file after recognition. One object is shared by all
+    # files with the same vertex declaration (see resolveVertexLayout()), so
+    # it is read-only: index lists are tuples, changing items raises.
+    def __init__(self, layout):
+        dict.__init__(self, (
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in layout.items()
+        ))
+
+    def readOnly(self, *args, **kwargs):
+        raise TypeError("ResolvedLayout is read-only")
+
+    __setitem__ = __delitem__ = readOnly
+    clear = pop = popitem = setdefault = update = readOnly
+
+    def __reduce__(self):
+        return ResolvedLayout, (dict(self),)
+
+
+class RipFormatError(Exception):
+    pass
+
+
+class RipMesh(object):
+    # Decoded content of a single .rip file.
+    # faces     - uint32 index buffer, 3 indexes per triangle. May be a view
+    #             into the mapped file.
+    # positions - float32 (vertexCount x 4), missing components are 0.
+    # normals   - float32 (vertexCount x nmlCount).
+    # u, v      - float32 (vertexCount), v is already flipped for Maya.
+    # colors    - float32 RGBA (vertexCount x 4) or None if not present.
+    # uvFaces   - UV index per face vertex, when UVs are indexed separately
+    #             from positions (after welding). None - same as faces.
+    # sourceFaces - index into normals/colors per face vertex, once welding
+    #             has changed vertex indexes. None - same as faces.
+    __slots__ = (
+        'path', 'header', 'layout', 'attributes', 'textures', 'shaders',
+        'faces', 'positions', 'normals', 'u', 'v', 'colors', 'uvFaces',
+        'sourceFaces'
+    )
+
+    def __init__(self, path, header, layout, attributes, textures, shaders,
+                 faces, positions, normals, u, v, colors=None, uvFaces=None,
+                 sourceFaces=None):
+        self.path = path
+        self.header = header
+        self.layout = layout
+        self.attributes = attributes
+        self.textures = textures
+        self.shaders = shaders
+        self.faces = faces
+        self.positions = positions
+        self.normals = normals
+        self.u = u
+        self.v = v
+        self.colors = colors
+        self.uvFaces = uvFaces
+        self.sourceFaces = sourceFaces
+
+    def faceCount(self):
+        return len(self.faces) // 3
+
+    def vertexCount(self):
+        return len(self.positions)
+
+    def is3DModel(self):
+        return self.layout['posCount'] >= 3 and self.layout['uvwCount'] == 2
+
+    def isComplete(self):
+        return (
+            self.header[3] == self.vertexCount() and
+            self.header[2] == self.faceCount()
+        )
+
+    def textureFile(self, index):
+        if self.textures:
+            return self.textures[index]
+        return DefaultTextureFile
+
+    def contentHash(self):
+        # Same geometry drawn several times per frame gives the same hash.
+        hasher = hashlib.sha1()
+        for data in (self.faces, self.positions, self.normals, self.u,
+                     self.v, self.colors):
+            if data is not None:
+                hasher.update(numpy.ascontiguousarray(data).data)
+        return hasher.hexdigest()
+
+
+class RipMeshCache(object):
+    # Decoded meshes stored as mesh files (see writeRipMesh()) keyed by
+    # source path, size, mtime and layout template, so a hit is a few views
+    # into a mapped file. Once the directory grows over 'maxSize' bytes,
+    # least recently used entries are removed until it is under
+    # 'maxSize' * EvictTarget. The size is kept as a running total, the
+    # directory is only listed on the first store and on eviction.
+    EvictTarget = 0.9
+
+    def __init__(self, directory, maxSize):
+        self.directory = directory
+        self.maxSize = maxSize
+        self.totalSize = None
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def entryPath(self, path, layout):
+        stat = os.stat(path)
+        key = json.dumps(
+            [os.path.abspath(path), stat.st_size, stat.st_mtime, layout],
+            sort_keys=True
+        )
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + MeshFileExtension)
+
+    def load(self, path, layout):
+        entryPath = self.entryPath(path, layout)
+        try:
+            ripMesh = readRipMeshFile(entryPath)
+            os.utime(entryPath, None)  # Mark as recently used.
+        except (EnvironmentError, RipFormatError, KeyError, ValueError):
+            return None
+
+        ripMesh.path = path
+        return ripMesh
+
+    def store(self, ripMesh, layout):
+        entryPath = self.entryPath(ripMesh.path, layout)
+        fd, tempPath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writeRipMesh(f, ripMesh)
+            size = os.path.getsize(tempPath)
+            if os.path.exists(entryPath):
+                size -= os.path.getsize(entryPath)
+                os.remove(entryPath)
+            os.rename(tempPath, entryPath)
+        except EnvironmentError:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            return
+
+        with self.lock:
+            if self.totalSize is None:
+                self.totalSize = sum(entry[1] for entry in self.entries())
+            else:
+                self.totalSize += size
+            if self.totalSize > self.maxSize:
+                self.evict()
+
+    def entries(self):
+        # [(mtime, size, name)] of all entries.
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(MeshFileExtension):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        # Called with the lock held. Also corrects the running total for
+        # entries added or removed by other processes.
+        entries = self.entries()
+        totalSize = sum(entry[1] for entry in entries)
+        for mtime, size, name in sorted(entries):
+            if totalSize <= self.maxSize * self.EvictTarget:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue  # Still mapped.
+            totalSize -= size
+        self.totalSize = totalSize
+
+
+class ImportStats(object):
+    # Wall time of import stages, in total and per file:
+    #   stats.setFile(path, vertexCount, faceCount)
+    #   with stats.stage('create'):
+    #       ...
+    # Time is added to the file set last (nothing, if it is None).
+    def __init__(self):
+        self.stages = collections.OrderedDict()  # name -> [seconds, calls]
+        self.files = collections.OrderedDict()  # name -> counters
+        self.current = None
+        self.started = timeit.default_timer()
+
+    def setFile(self, name, vertexes=0, faces=0):
+        if name is None:
+            self.current = None
+            return
+        self.current = self.files.setdefault(name, {
+            'vertexes': 0, 'faces': 0, 'seconds': 0.0, 'stages': {}
+        })
+        self.current['vertexes'] = max(self.current['vertexes'], vertexes)
+        self.current['faces'] = max(self.current['faces'], faces)
+
+    def add(self, name, seconds):
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += 1
+        if self.current is not None:
+            self.current['seconds'] += seconds
+            stages = self.current['stages']
+            stages[name] = stages.get(name, 0.0) + seconds
+
+    def stage(self, name):
+        return StageTimer(self, name)
+
+    def report(self, slowestFiles=5):
+        # Lines of the summary table: stages sorted by time, then the
+        # slowest files.
+        total = timeit.default_timer() - self.started
+        lines = [
+            "Import timings: {} file(s), {:.2f} s".format(
+                len(self.files), total
+            ),
+            "{:<16}{:>12}{:>8}{:>8}".format(
+                "stage", "time, ms", "share", "calls"
+            )
+        ]
+        stages = sorted(
+            self.stages.items(), key=lambda item: item[1][0], reverse=True
+        )
+        for name, (seconds, calls) in stages:
+            lines.append("{:<16}{:>12.1f}{:>7.1f}%{:>8}".format(
+                name, seconds * 1000, seconds * 100 / max(total, 1e-9),
+                calls
+            ))
+
+        files = sorted(
+            self.files.items(), key=lambda item: item[1]['seconds'],
+            reverse=True
+        )
+        if files:
+            lines.append("Slowest files:")
+        for name, counters in files[:slowestFiles]:
+            slowest = ("-", 0.0)
+            if counters['stages']:
+                slowest = max(
+                    counters['stages'].items(), key=lambda item: item[1]
+                )
+            lines.append(
+                "{:>10.1f} ms  {} ({} vertexes, {} faces, mostly {})".format(
+                    counters['seconds'] * 1000, name, counters['vertexes'],
+                    counters['faces'], slowest[0]
+                )
+            )
+        return lines
+
+
+class StageTimer(object):
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.add(self.name, timeit.default_timer() - self.start)
+        return False
+
+
+class NullStats(object):
+    # ImportStats stand-in used when timings are off: no clock reads, no
+    # bookkeeping, the same (shared) context manager for every stage.
+    def setFile(self, name, vertexes=0, faces=0):
+        pass
+
+    def add(self, name, seconds):
+        pass
+
+    def stage(self, name):
+        return self
+
+    def report(self, slowestFiles=5):
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NoStats = NullStats()
+
+
+def toStr(data):
+    # Names are stored as raw bytes. Keep them as 'str' on both pythons.
+    if isinstance(data, str):
+        return data
+    return data.decode('latin-1')
+
+
+def readULong(f):
+    return struct.unpack('<L', f.read(4))[0]
+
+
+def readLong(f):
+    return struct.unpack('<l', f.read(4))[0]
+
+
+def readFloat(f):
+    return struct.unpack('<f', f.read(4))[0]
+
+
+def readString(f):
+    # Null-terminated string. Searches the terminator in whole chunks and
+    # seeks back to the byte right after it.
+    if isinstance(f, mmap.mmap):
+        start = f.tell()
+        end = f.find(b"\0", start)
+        if end < 0:
+            end = len(f)
+        f.seek(min(end + 1, len(f)))
+        return toStr(f[start:end])
+
+    chunks = []
+    while True:
+        chunk = f.read(StringChunkSize)
+        end = chunk.find(b"\0")
+        if end >= 0:
+            chunks.append(chunk[:end])
+            f.seek(end + 1 - len(chunk), os.SEEK_CUR)
+            break
+        chunks.append(chunk)
+        if len(chunk) < StringChunkSize:
+            break
+    return toStr(b"".join(chunks))
+
+
+def openRIPFile(path, mapFile=True):
+    f = open(path, "rb")
+    if not mapFile or os.path.getsize(path) == 0:
+        return f
+    with f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def readBlock(f, size, dtype):
+    # Read up to 'size' bytes as an array of 'dtype'. For mapped files the
+    # result is a zero-copy view into the mapping at the current offset.
+    dtype = numpy.dtype(dtype)
+    if isinstance(f, mmap.mmap):
+        offset = f.tell()
+        size = min(size, len(f) - offset)
+        f.seek(offset + size)
+        return numpy.frombuffer(
+            f, dtype=dtype, count=size // dtype.itemsize, offset=offset
+        )
+
+    data = f.read(size)
+    return numpy.frombuffer(
+        data, dtype=dtype, count=len(data) // dtype.itemsize
+    )
+
+
+def readRIPHeader(f):
+    # Header:
+    # [0] - signature
+    # [1] - version
+    # [2] - dwFacesCnt
+    # [3] - dwVertexesCnt
+    # [4] - VertexSize
+    # [5] - TextureFilesCnt
+    # [6] - ShaderFilesCnt
+    # [7] - VertexAttributesCnt
+    data = f.read(32)
+    if len(data) != 32:
+        raise RipFormatError("Unexpected end of file in RIP header")
+    return struct.unpack('<LLLLLLLL', data)
+
+
+def checkRIPHeader(header):
+    if header[0] != RipSignature:
+        raise RipFormatError(
+            "Expected signature '{}' (got '{}')".format(
+                RipSignature, header[0]
+            )
+        )
+
+    if header[1] != RipFileVersion:
+        raise RipFormatError(
+            "Expected version '{}' (got '{}')".format(
+                RipFileVersion, header[1]
+            )
+        )
+
+
+def updateVertexLayoutIndexes(layout, t, baseIndex, count):
+    if t is None:
+        return
+
+    keyUpdated = "{}Updated".format(t)
+    keyCount = "{}Count".format(t)
+    if layout[keyUpdated] is False:
+        if count > len(layout[t]):
+            raise RipFormatError(
+                "Vertex attribute of {} dwords, at most {} are supported"
+                " for '{}'".format(count, len(layout[t]), t)
+            )
+        for i in range(count):
+            layout[t][i] = baseIndex + i
+        layout[keyUpdated] = True
+        layout[keyCount] = count
+
+
+def resetVertexLayout(layout):
+    for t in ('pos', 'nml', 'uvw', 'clr'):
+        layout['{}Updated'.format(t)] = False
+        layout['{}Count'.format(t)] = 0
+
+
+def readRIPVertexAttrib(f, count):
+    # Returns struct type string of a vertex and the attribute list:
+    # vertexAttributes[i]:
+    # [0] semantic
+    # [1] index of the first dword
+    # [2] count of dwords
+    # [3] semantic index
+    result = ''
+    types = {0: 'f', 1: 'L', 2: 'l'}
+    vertexAttributes = []
+
+    for i in range(count):
+        semantic = readString(f)
+        semanticIndex = readULong(f)
+        offset = readULong(f)
+        size = readULong(f)
+        typeMapElements = readULong(f)
+        for j in range(typeMapElements):
+            result += types.get(readULong(f), 'L')
+
+        vertexAttributes.append(
+            [semantic, offset // 4, size // 4, semanticIndex]
+        )
+
+    return result, vertexAttributes
+
+
+def applyRecognitionLogic(layout, vertexAttributes):
+    shortNames = {
+        'POSITION': 'pos', 'NORMAL': 'nml', 'TEXCOORD': 'uvw',
+        'SV_POSITION': 'pos', 'COLOR': 'clr'
+    }
+
+    for attribute in vertexAttributes:
+        updateVertexLayoutIndexes(
+            layout, shortNames.get(attribute[0], None), attribute[1],
+            attribute[2]
+        )
+
+
+# Layouts recognized this session: (template, vertex declaration) -> layout.
+RecognizedLayouts = {}
+RecognizedLayoutsLock = threading.Lock()
+
+
+def resolveVertexLayout(template, vertDict, vertexAttributes):
+    # Layout of a file from the layout template and its vertex declaration
+    # (attribute semantics, indexes, offsets, sizes and type map). Every
+    # distinct declaration is recognized once, files that share it get the
+    # same ResolvedLayout. Safe to call from several threads.
+    templateKey = json.dumps(template, sort_keys=True)
+    key = (templateKey, vertDict, tuple(
+        tuple(attribute) for attribute in vertexAttributes
+    ))
+    with RecognizedLayoutsLock:
+        layout = RecognizedLayouts.get(key)
+    if layout is not None:
+        return layout
+
+    layout = json.loads(templateKey)  # Private, mutable copy.
+    resetVertexLayout(layout)
+    if layout['autoMode'] is True:  # AUTO recognition.
+        applyRecognitionLogic(layout, vertexAttributes)
+    for t in layout['ignore']:
+        layout['{}Count'.format(t)] = 0
+    with RecognizedLayoutsLock:
+        return RecognizedLayouts.setdefault(key, ResolvedLayout(layout))
+
+
+def readRIPStrings(f, count):
+    result = []
+    for i in range(count):
+        result.append(readString(f))
+
+    return result
+
+
+def decodeRIPFaces(f, count):
+    # Raw little-endian index buffer, 3 indexes per triangle. The result is
+    # a read-only view over the bytes read from file, no copies are made.
+    return readBlock(f, count * 12, '<u4')
+
+
+def makeVertexDtype(vertDict):
+    # One little-endian 4-byte field per entry of the struct type string.
+    types = {'f': '<f4', 'L': '<u4', 'l': '<i4'}
+    return numpy.dtype([
+        ('f{}'.format(i), types[t]) for i, t in enumerate(vertDict)
+    ])
+
+
+def layoutColumns(layout, t):
+    # Dword indexes of the layout[t] components in use.
+    return layout[t][:layout['{}Count'.format(t)]]
+
+
+def decodeVertexColumns(views, vertDict, columns, out):
+    # Copy dword 'columns' of a chunk into the columns of 'out' (2D output
+    # view). Neighbouring dwords of one type go as one strided block copy.
+    # Columns of 'out' past len(columns) keep their prefilled value.
+    columns = columns[:out.shape[1]]
+    i = 0
+    while i < len(columns):
+        first = columns[i]
+        n = 1
+        while (i + n < len(columns) and columns[i + n] == first + n and
+               vertDict[first + n] == vertDict[first]):
+            n += 1
+        out[:, i:i + n] = views[vertDict[first]][:, first:first + n]
+        i += n
+
+
+def decodeVertexColors(views, vertDict, layout, colors):
+    columns = layoutColumns(layout, 'clr')
+    if len(columns) == 1 and vertDict[columns[0]] in 'Ll':
+        # Packed R8G8B8A8: bytes of the little-endian dword in RGBA order.
+        first = columns[0] * 4
+        colors[:] = views['B'][:, first:first + 4]
+        colors /= 255
+        return
+
+    decodeVertexColumns(views, vertDict, columns, colors)
+
+
+def iterVertexChunks(f, count, stride, chunkSize):
+    # Yields (first vertex, raw dwords) for at most 'chunkSize' vertexes at
+    # a time, raw dwords as a (vertexes x stride) array. Stops early on
+    # truncated files.
+    start = 0
+    while start < count and stride:
+        size = min(chunkSize, count - start)
+        chunk = readBlock(f, size * stride * 4, '<u4')
+        chunk = chunk[:len(chunk) // stride * stride].reshape(-1, stride)
+        if len(chunk):
+            yield start, chunk
+        start += len(chunk)
+        if len(chunk) < size:
+            break
+
+
+def decodeRIPVertexes(f, count, vertDict, layout, chunkSize=None):
+    # Vertexes are decoded chunk by chunk straight into the output arrays,
+    # so the raw vertex block is never held in memory as a whole. Only the
+    # dwords the layout refers to are touched: each one is a strided column
+    # view over the raw chunk, the rest of the vertex is skipped.
+    chunkSize = chunkSize or VertexChunkSize
+    stride = len(vertDict)
+
+    positions = numpy.zeros((count, 4), dtype=numpy.float32)
+    normals = numpy.zeros((count, layout['nmlCount']), dtype=numpy.float32)
+    uv = numpy.zeros((2, count), dtype=numpy.float32)
+    u, v = uv
+    colors = None
+    if layout['clrCount']:
+        colors = numpy.ones((count, 4), dtype=numpy.float32)
+
+    columns = [
+        (layoutColumns(layout, 'pos'), positions),
+        (layoutColumns(layout, 'nml'), normals),
+        (layoutColumns(layout, 'uvw'), uv.T),
+    ]
+
+    decoded = 0
+    for start, chunk in iterVertexChunks(f, count, stride, chunkSize):
+        end = start + len(chunk)
+        # Same dwords seen as each of the RIP types, plus bytes for colors.
+        views = {
+            'f': chunk.view('<f4'), 'L': chunk, 'l': chunk.view('<i4'),
+            'B': chunk.view(numpy.uint8),
+        }
+        for indexes, out in columns:
+            decodeVertexColumns(views, vertDict, indexes, out[start:end])
+        if colors is not None:
+            decodeVertexColors(views, vertDict, layout, colors[start:end])
+        decoded = end
+
+    # Maya V axis points up.
+    numpy.subtract(1, v, out=v)
+
+    # A truncated file yields fewer vertexes; RipMesh.isComplete() tells.
+    if decoded < count:
+        positions, normals, u, v = [
+            a[:decoded] for a in (positions, normals, u, v)
+        ]
+        if colors is not None:
+            colors = colors[:decoded]
+
+    # DecodedVertexes:
+    # [0] - positions (count x 4)
+    # [1] - normals (count x nmlCount)
+    # [2] - U (count)
+    # [3] - V (count)
+    # [4] - colors (count x 4) or None
+    return [positions, normals, u, v, colors]
+
+
+def checkVertexLayout(layout, vertDict):
+    # Every component the layout uses must be inside the vertex.
+    for t in ('pos', 'nml', 'uvw', 'clr'):
+        for index in layoutColumns(layout, t):
+            if index >= len(vertDict):
+                raise RipFormatError(
+                    "Vertex layout '{}' refers to dword {} of a {}-dword"
+                    " vertex".format(t, index, len(vertDict))
+                )
+
+
+def readRIPTables(f, layout):
+    # Everything in front of the face block.
+    header = readRIPHeader(f)
+    checkRIPHeader(header)
+
+    try:
+        # Read vertex attributes.
+        vertDict, vertexAttributes = readRIPVertexAttrib(f, header[7])
+        layout = resolveVertexLayout(layout, vertDict, vertexAttributes)
+        checkVertexLayout(layout, vertDict)
+        # Read textures list (if present).
+        textures = readRIPStrings(f, header[5])
+        # Read shader list (if present).
+        shaders = readRIPStrings(f, header[6])
+    except struct.error:
+        raise RipFormatError("Unexpected end of file in RIP tables")
+    return header, layout, vertDict, vertexAttributes, textures, shaders
+
+
+def rotationMatrix(rx, ry, rz):
+    # Maya 'xyz' rotation order for row vectors, angles in degrees.
+    rx, ry, rz = [math.radians(a) for a in (rx, ry, rz)]
+    cx, sx = math.cos(rx), math.sin(rx)
+    cy, sy = math.cos(ry), math.sin(ry)
+    cz, sz = math.cos(rz), math.sin(rz)
+    matX = numpy.array([[1, 0, 0], [0, cx, sx], [0, -sx, cx]])
+    matY = numpy.array([[cy, 0, -sy], [0, 1, 0], [sy, 0, cy]])
+    matZ = numpy.array([[cz, sz, 0], [-sz, cz, 0], [0, 0, 1]])
+    return matX.dot(matY).dot(matZ)
+
+
+def transformRipMesh(ripMesh, scale, rotation, uScale, vScale):
+    # Same result as setting scale/rotate on the transform node and
+    # freezing it, followed by polyEditUV -su uScale -sv vScale.
+    rotate = rotationMatrix(*rotation)
+
+    positions = ripMesh.positions.copy()
+    positions[:, :3] = ripMesh.positions[:, :3].dot(rotate * scale)
+    ripMesh.positions = positions
+
+    if ripMesh.normals.shape[1] >= 3:
+        normals = ripMesh.normals.copy()
+        normals[:, :3] = ripMesh.normals[:, :3].dot(rotate)
+        ripMesh.normals = normals
+
+    ripMesh.u = ripMesh.u * numpy.float32(uScale)
+    ripMesh.v = ripMesh.v * numpy.float32(vScale)
+
+
+def reverseWinding(ripMesh):
+    # Swap two indexes of every triangle and negate vertex normals. Flips
+    # face and shading normals just like polyNormal does.
+    for name in ('faces', 'uvFaces', 'sourceFaces'):
+        faces = getattr(ripMesh, name)
+        if faces is not None:
+            setattr(ripMesh, name, faces.reshape(-1, 3)[:, [0, 2, 1]].ravel())
+
+    if ripMesh.normals.shape[1] >= 3:
+        normals = ripMesh.normals.copy()
+        normals[:, :3] = -ripMesh.normals[:, :3]
+        ripMesh.normals = normals
+
+
+def weldKeys(keys):
+    # Returns (first, remap): indexes of the first row of each distinct key
+    # in order of appearance, and the new index of every row.
+    unique, first, inverse = numpy.unique(
+        keys, axis=0, return_index=True, return_inverse=True
+    )
+    order = numpy.argsort(first)
+    rank = numpy.empty(len(order), dtype=numpy.uint32)
+    rank[order] = numpy.arange(len(order), dtype=numpy.uint32)
+    return first[order], rank[inverse.ravel()]
+
+
+def quantize(values, tolerance):
+    return numpy.floor(values / tolerance + 0.5).astype(numpy.int64)
+
+
+def weldRipMesh(ripMesh, tolerance, uvTolerance):
+    # Merge vertexes closer than 'tolerance' (on a grid of that step), then
+    # UVs closer than 'uvTolerance' on the same merged vertex, like
+    # polyMergeVertex followed by polyMergeUV. Vertexes on UV seams share a
+    # position but keep their own UVs, equal UVs of different vertexes stay
+    # apart. Normals and colors keep the original indexing (see
+    # sourceFaces), so hard edges stay.
+    faces = ripMesh.faces
+    uvFaces = faces if ripMesh.uvFaces is None else ripMesh.uvFaces
+    if len(faces) and faces.max() >= len(ripMesh.positions):
+        return  # Broken index buffer, leave it to Maya to complain.
+
+    if ripMesh.sourceFaces is None:
+        ripMesh.sourceFaces = faces
+
+    if len(ripMesh.positions):
+        first, remap = weldKeys(
+            quantize(ripMesh.positions[:, :3], tolerance)
+        )
+        ripMesh.positions = ripMesh.positions[first]
+        faces = remap[faces]
+
+    if len(uvFaces):
+        # One key per face vertex: merged vertex and its quantized UV.
+        first, remap = weldKeys(numpy.column_stack((
+            faces.astype(numpy.int64),
+            quantize(ripMesh.u[uvFaces], uvTolerance),
+            quantize(ripMesh.v[uvFaces], uvTolerance)
+        )))
+        ripMesh.u = ripMesh.u[uvFaces[first]]
+        ripMesh.v = ripMesh.v[uvFaces[first]]
+        uvFaces = remap
+
+    ripMesh.faces = faces
+    ripMesh.uvFaces = uvFaces
+
+
+def compactVertexes(faces, arrays):
+    # Keep the vertexes 'faces' refers to, in their order. Returns remapped
+    # faces and the compacted 'arrays' (None stays None).
+    used = numpy.zeros(len(arrays[0]), dtype=bool)
+    used[faces] = True
+    if used.all():
+        return faces, arrays
+    remap = (numpy.cumsum(used) - 1).astype(numpy.uint32)
+    return remap[faces], [None if a is None else a[used] for a in arrays]
+
+
+def cleanRipMesh(ripMesh):
+    # Drop faces with repeated indexes (strips stored as lists, collapsed
+    # LODs) or zero area, then the vertexes no face refers to, so only what
+    # is actually drawn reaches Maya. Returns the number of faces removed.
+    # A complete mesh stays complete: header counts follow the arrays.
+    # owners: index buffer -> vertex arrays it indexes (see RipMesh).
+    owners = {'faces': ['positions']}
+    uvOwner = 'faces' if ripMesh.uvFaces is None else 'uvFaces'
+    sourceOwner = 'faces' if ripMesh.sourceFaces is None else 'sourceFaces'
+    owners.setdefault(uvOwner, []).extend(['u', 'v'])
+    owners.setdefault(sourceOwner, []).extend(['normals', 'colors'])
+
+    faces = ripMesh.faces
+    if len(faces) % 3:
+        return 0
+    complete = ripMesh.isComplete()
+    for owner, names in owners.items():
+        indexes = getattr(ripMesh, owner)
+        if len(indexes) and indexes.max() >= len(getattr(ripMesh, names[0])):
+            return 0  # Broken index buffer, leave it to Maya to complain.
+
+    triangles = faces.reshape(-1, 3)
+    keep = (
+        (triangles[:, 0] != triangles[:, 1]) &
+        (triangles[:, 1] != triangles[:, 2]) &
+        (triangles[:, 0] != triangles[:, 2])
+    )
+    corners = ripMesh.positions[:, :3][triangles]
+    normals = numpy.cross(
+        corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    )
+    keep &= normals.any(axis=1)
+
+    removed = len(keep) - int(numpy.count_nonzero(keep))
+    for owner in ('faces', 'uvFaces', 'sourceFaces'):
+        indexes = getattr(ripMesh, owner)
+        if removed and indexes is not None:
+            setattr(ripMesh, owner, indexes.reshape(-1, 3)[keep].ravel())
+
+    for owner, names in owners.items():
+        indexes, arrays = compactVertexes(
+            getattr(ripMesh, owner), [getattr(ripMesh, n) for n in names]
+        )
+        setattr(ripMesh, owner, indexes)
+        for name, data in zip(names, arrays):
+            setattr(ripMesh, name, data)
+
+    if complete:
+        header = list(ripMesh.header)
+        header[2] = ripMesh.faceCount()
+        header[3] = ripMesh.vertexCount()
+        ripMesh.header = tuple(header)
+    return removed
+
+
+def combineRipMeshes(ripMeshes):
+    # Concatenate meshes into one, offsetting all index buffers. Returns the
+    # combined mesh and the table of source ranges:
+    # sources[i]:
+    # [0] path
+    # [1] first face
+    # [2] face count
+    # [3] first vertex
+    # [4] vertex count
+    withNormals = all(m.normals.shape[1] >= 3 for m in ripMeshes)
+    withColors = any(m.colors is not None for m in ripMeshes)
+    faces, uvFaces, sourceFaces, normals, colors = [], [], [], [], []
+    sources = []
+    faceCount = vertexCount = uvCount = sourceCount = 0
+    for m in ripMeshes:
+        faces.append(m.faces + numpy.uint32(vertexCount))
+        mUVFaces = m.faces if m.uvFaces is None else m.uvFaces
+        uvFaces.append(mUVFaces + numpy.uint32(uvCount))
+        mSourceFaces = m.faces if m.sourceFaces is None else m.sourceFaces
+        sourceFaces.append(mSourceFaces + numpy.uint32(sourceCount))
+        if withNormals:
+            normals.append(m.normals[:, :3])
+        if withColors:
+            mColors = m.colors
+            if mColors is None:
+                mColors = numpy.ones((len(m.normals), 4), numpy.float32)
+            colors.append(mColors)
+
+        sources.append([
+            m.path, faceCount, m.faceCount(), vertexCount, m.vertexCount()
+        ])
+        faceCount += m.faceCount()
+        vertexCount += m.vertexCount()
+        uvCount += len(m.u)
+        sourceCount += len(m.normals)
+
+    first = ripMeshes[0]
+    header = (
+        RipSignature, RipFileVersion, faceCount, vertexCount, 0, 0, 0, 0
+    )
+    if withNormals:
+        normals = numpy.concatenate(normals)
+    else:
+        normals = numpy.zeros((sourceCount, 0), dtype=numpy.float32)
+
+    combined = RipMesh(
+        None, header, first.layout, [], first.textures, [],
+        numpy.concatenate(faces),
+        numpy.concatenate([m.positions for m in ripMeshes]),
+        normals,
+        numpy.concatenate([m.u for m in ripMeshes]),
+        numpy.concatenate([m.v for m in ripMeshes]),
+        numpy.concatenate(colors) if withColors else None,
+        numpy.concatenate(uvFaces), numpy.concatenate(sourceFaces)
+    )
+    return combined, sources
+
+
+def readRIP(f, path, layout):
+    header, layout, vertDict, vertexAttributes, textures, shaders = \
+        readRIPTables(f, layout)
+    # Read mesh faces.
+    faces = decodeRIPFaces(f, header[2])
+    # Read vertexes data.
+    positions, normals, u, v, colors = decodeRIPVertexes(
+        f, header[3], vertDict, layout
+    )
+
+    return RipMesh(
+        path, header, layout, vertexAttributes, textures, shaders, faces,
+        positions, normals, u, v, colors
+    )
+
+
+def writeRIP(f, faces, vertexData, attributes, textures=(), shaders=()):
+    # Write a RIP v4 file. 'vertexData' is a structured array of vertexes,
+    # its fields must follow the order of 'attributes'.
+    # attributes[i]:
+    # [0] semantic
+    # [1] semantic index
+    # [2] offset in bytes
+    # [3] type map (0 - float, 1 - uint, 2 - int per dword)
+    faces = numpy.asarray(faces, dtype='<u4')
+    f.write(struct.pack(
+        '<LLLLLLLL', RipSignature, RipFileVersion, len(faces) // 3,
+        len(vertexData), vertexData.dtype.itemsize, len(textures),
+        len(shaders), len(attributes)
+    ))
+
+    for semantic, index, offset, typeMap in attributes:
+        f.write(semantic.encode('latin-1') + b"\0")
+        f.write(struct.pack(
+            '<LLLL', index, offset, len(typeMap) * 4, len(typeMap)
+        ))
+        f.write(struct.pack('<{}L'.format(len(typeMap)), *typeMap))
+
+    for name in list(textures) + list(shaders):
+        f.write(name.encode('latin-1') + b"\0")
+
+    f.write(faces.tobytes())
+    f.write(numpy.ascontiguousarray(vertexData).tobytes())
+
+
+def writeRIPFile(path, faces, vertexData, attributes, textures=(),
+                 shaders=()):
+    with open(path, "wb") as f:
+        writeRIP(f, faces, vertexData, attributes, textures, shaders)
+
+
+def isRipMeshFile(path):
+    return path.lower().endswith(MeshFileExtension)
+
+
+def writeRipMesh(f, ripMesh):
+    # Decoded mesh, ready to be loaded as array views:
+    # [0]  signature "NRMF"
+    # [4]  version
+    # [8]  metadata size
+    # [12] data offset, a MeshFileAlignment multiple
+    # [16] metadata: JSON with header, resolved layout, attributes,
+    #      textures, shaders and [name, offset, dtype, shape] per array
+    # Array offsets are relative to the data offset, every array starts at
+    # a MeshFileAlignment boundary.
+    def align(offset):
+        return -(-offset // MeshFileAlignment) * MeshFileAlignment
+
+    arrays = []
+    table = []
+    offset = 0
+    for name in RipMesh.__slots__:
+        data = getattr(ripMesh, name)
+        if not isinstance(data, numpy.ndarray):
+            continue
+        data = numpy.ascontiguousarray(
+            data, dtype=data.dtype.newbyteorder('<')
+        )
+        arrays.append(data)
+        table.append([name, offset, data.dtype.str, list(data.shape)])
+        offset = align(offset + data.nbytes)
+
+    metaData = json.dumps({
+        'path': ripMesh.path, 'header': list(ripMesh.header),
+        'layout': ripMesh.layout, 'attributes': ripMesh.attributes,
+        'textures': ripMesh.textures, 'shaders': ripMesh.shaders,
+        'arrays': table
+    }).encode('utf-8')
+    dataOffset = align(16 + len(metaData))
+
+    f.write(MeshFileSignature)
+    f.write(struct.pack('<LLL', MeshFileVersion, len(metaData), dataOffset))
+    f.write(metaData)
+    f.write(b"\0" * (dataOffset - 16 - len(metaData)))
+    position = 0
+    for entry, data in zip(table, arrays):
+        f.write(b"\0" * (entry[1] - position))
+        f.write(data.tobytes())
+        position = entry[1] + data.nbytes
+
+
+def writeRipMeshFile(path, ripMesh):
+    with open(path, "wb") as f:
+        writeRipMesh(f, ripMesh)
+
+
+def readRipMesh(f, path):
+    # 'f' is a mapped file (arrays are views into it) or a file object.
+    head = f.read(16)
+    if len(head) < 16 or head[:4] != MeshFileSignature:
+        raise RipFormatError("Not a NinjaRipper mesh file")
+    version, metaSize, dataOffset = struct.unpack('<LLL', head[4:])
+    if version != MeshFileVersion:
+        raise RipFormatError(
+            "Unsupported mesh file version: {}".format(version)
+        )
+    try:
+        meta = json.loads(toStr(f.read(metaSize)))
+    except ValueError:
+        raise RipFormatError("Broken mesh file metadata")
+
+    if isinstance(f, mmap.mmap):
+        data = f
+    else:
+        f.seek(dataOffset)
+        data = f.read()
+        dataOffset = 0
+
+    arrays = {}
+    for name, offset, dtype, shape in meta['arrays']:
+        dtype = numpy.dtype(dtype)
+        count = int(numpy.prod(shape))
+        offset += dataOffset
+        if offset + count * dtype.itemsize > len(data):
+            raise RipFormatError("Mesh file is truncated")
+        arrays[name] = numpy.frombuffer(
+            data, dtype=dtype, count=count, offset=offset
+        ).reshape(shape)
+
+    return RipMesh(
+        path, tuple(meta['header']), ResolvedLayout(meta['layout']),
+        meta['attributes'], meta['textures'], meta['shaders'],
+        arrays['faces'],
+        arrays['positions'], arrays['normals'], arrays['u'], arrays['v'],
+        arrays.get('colors'), arrays.get('uvFaces'),
+        arrays.get('sourceFaces')
+    )
+
+
+def readRipMeshFile(path, mapFile=True):
+    f = openRIPFile(path, mapFile)
+    if isinstance(f, mmap.mmap):
+        return readRipMesh(f, path)
+    with f:
+        return readRipMesh(f, path)
+
+
+def readRIPFile(path, layout=None, mapFile=True, cache=None):
+    # Mapped files are not closed explicitly: 'faces' of the result may
+    # still reference the mapping, it goes away with the last view.
+    # Decoded mesh files (.nrm) are loaded as they are.
+    if isRipMeshFile(path):
+        return readRipMeshFile(path, mapFile)
+
+    if layout is None:
+        layout = newVertexLayout()
+
+    if cache is not None:
+        ripMesh = cache.load(path, layout)
+        if ripMesh is not None:
+            return ripMesh
+
+    f = openRIPFile(path, mapFile)
+    if isinstance(f, mmap.mmap):
+        ripMesh = readRIP(f, path, layout)
+    else:
+        with f:
+            ripMesh = readRIP(f, path, layout)
+
+    if cache is not None:
+        cache.store(ripMesh, layout)
+    return ripMesh
+
+
+def tryReadRIPFile(path, layout, mapFile, cache):
+    # A broken or vanished file is an error of that file only, the rest of
+    # the batch goes on.
+    try:
+        return readRIPFile(path, layout, mapFile, cache), None
+    except (RipFormatError, struct.error, EnvironmentError) as e:
+        return None, e
+
+
+def readRIPFiles(paths, layout=None, mapFile=True, workers=0, maxPending=0,
+                 cache=None):
+    # Parse files on a thread pool and yield (path, ripMesh, error) in the
+    # order of 'paths'. NumPy releases the GIL while copying vertex data, so
+    # decoding of several files overlaps. At most 'maxPending' files are
+    # parsed ahead of the consumer to keep memory bounded.
+    # Exactly one of ripMesh/error is None.
+    workers = workers or multiprocessing.cpu_count()
+    maxPending = maxPending or workers * 2
+
+    paths = iter(paths)
+    pending = collections.deque()
+    pool = multiprocessing.pool.ThreadPool(workers)
+    try:
+        def submit(path):
+            pending.append((path, pool.apply_async(
+                tryReadRIPFile, (path, layout, mapFile, cache)
+            )))
+
+        for path in itertools.islice(paths, maxPending):
+            submit(path)
+
+        while pending:
+            path, result = pending.popleft()
+            for nextPath in itertools.islice(paths, 1):
+                submit(nextPath)
+            ripMesh, error = result.get()
+            yield path, ripMesh, error
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def readRIPInfo(path, layout=None):
+    # Catalog entry of a file: only header and name tables are read.
+    if layout is None:
+        layout = newVertexLayout()
+
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        header, layout, vertDict, vertexAttributes, textures, shaders = \
+            readRIPTables(f, layout)
+        dataOffset = f.tell()
+
+    vertexSize = len(vertDict) * 4
+    dataSize = header[2] * 12 + header[3] * vertexSize
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'faces': header[2],
+        'vertexes': header[3],
+        'vertexSize': vertexSize,
+        'vertexStruct': vertDict,
+        'attributes': vertexAttributes,
+        'layout': layout,
+        'textures': textures,
+        'shaders': shaders,
+        'is3DModel': layout['posCount'] >= 3 and layout['uvwCount'] == 2,
+        'isComplete': stat.st_size >= dataOffset + dataSize,
+    }
+
+
+def loadCatalog(directory):
+    try:
+        with open(os.path.join(directory, CatalogFileName), "r") as f:
+            catalog = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    if catalog.get('version') != CatalogVersion:
+        return {}
+    return catalog['files']
+
+
+def saveCatalog(directory, files):
+    try:
+        with open(os.path.join(directory, CatalogFileName), "w") as f:
+            json.dump({'version': CatalogVersion, 'files': files}, f)
+    except (IOError, OSError):
+        pass  # Read-only capture folder: keep the catalog in memory only.
+
+
+def isCatalogEntryValid(entry, stat, layout):
+    return (
+        entry.get('size') == stat.st_size and
+        entry.get('mtime') == stat.st_mtime and
+        entry['layout']['autoMode'] == layout['autoMode']
+    )
+
+
+def updateCatalog(directory, layout=None, fileNames=None):
+    # Returns {fileName: entry} for all .rip files of 'directory' (or only
+    # 'fileNames'). Entries of unchanged files are taken from the saved
+    # catalog, only new or modified files are scanned. Files that vanished
+    # have no entry.
+    if layout is None:
+        layout = newVertexLayout()
+    if fileNames is None:
+        fileNames = [
+            name for name in os.listdir(directory)
+            if name.lower().endswith('.rip')
+        ]
+
+    files = loadCatalog(directory)
+    result = {}
+    changed = False
+    for name in fileNames:
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entry = files.get(name)
+        if entry is not None and isCatalogEntryValid(entry, stat, layout):
+            result[name] = entry
+            continue
+
+        try:
+            entry = readRIPInfo(path, layout)
+        except (RipFormatError, struct.error, EnvironmentError):
+            entry = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                     'layout': layout, 'isRIP': False}
+        files[name] = entry
+        result[name] = entry
+        changed = True
+
+    if changed:
+        saveCatalog(directory, files)
+    return result
+
+
+def isImportable(entry, importAnything=False):
+    if not entry.get('isRIP', True):
+        return False
+    return (entry['is3DModel'] or importAnything) and entry['isComplete']
+
+
+def filterRIPFiles(paths, layout=None, importAnything=False):
+    # Drop files that the catalog already knows are not importable.
+    # Manual layouts are not recognized from headers, keep those as is.
+    # Decoded mesh files are always kept.
+    if layout is not None and layout['autoMode'] is False:
+        return list(paths)
+
+    byDirectory = collections.OrderedDict()
+    importable = set()
+    for path in paths:
+        if isRipMeshFile(path):
+            importable.add(path)
+            continue
+        directory, name = os.path.split(path)
+        byDirectory.setdefault(directory, []).append(name)
+
+    for directory, names in byDirectory.items():
+        catalog = updateCatalog(directory, layout, names)
+        for name in names:
+            entry = catalog.get(name)
+            if entry is not None and isImportable(entry, importAnything):
+                importable.add(os.path.join(directory, name))
+
+    return [path for path in paths if path in importable]
+
+
+def findRIPFiles(directory):
+    # .rip files of a capture folder including its _Frame/_Forced folders.
+    paths = []
+    for root, directories, names in os.walk(directory):
+        directories.sort()
+        paths.extend(
+            os.path.join(root, name) for name in sorted(names)
+            if name.lower().endswith('.rip')
+        )
+    return paths
+
+
+def fileState(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def fileContentHash(path, chunkSize=1 << 20):
+    hasher = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunkSize), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def findModifiedFiles(paths, known):
+    # Returns {path: [size, mtime]} of files that are not in 'known' or
+    # whose size/mtime differ from known[path] ([size, mtime, ...]).
+    modified = {}
+    for path in paths:
+        try:
+            state = fileState(path)
+        except OSError:
+            continue  # Removed meanwhile.
+        entry = known.get(path)
+        if entry is None or list(entry[:2]) != state:
+            modified[path] = state
+    return modified
@@ -1,16 +1,63 @@
 import maya.cmds as cmds
 import maya.OpenMaya as OpenMaya
 import maya.mel as mel
-import struct
+import base64
+import json
 import os
 import os.path
+import tempfile
+import threading
+import traceback
 import unicodedata
-import _winreg as reg
+import zlib
 
-g_debugMessages = True
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import _winreg as reg
+except ImportError:
+    reg = None  # Not Windows: settings go to optionVars or a JSON file.
 
-RipSignature = 0xDEADC0DE
-RipFileVersion = 4
+# Imported by initialize() on first use.
+core = None
+numpy = None
+
+g_debugMessages = True
+g_printTimings = False  # Print time of import stages after every import.
+Stats = None  # core.ImportStats of the running import or core.NoStats.
+g_memoryMapFiles = True  # Read faces/vertexes as views over mapped file.
+g_parseWorkers = 0  # Threads parsing files of a batch. 0 - CPU count.
+g_useCatalog = True  # Skip non-3D files of a batch using header catalog.
+# Decoded meshes are kept here between imports. Size in MB, 0 - disabled.
+g_meshCacheDirectory = os.path.join(tempfile.gettempdir(), "NinjaRipperCache")
+g_meshCacheSize = 2048
+MeshCache = None
+# Shading group per texture file, shared by all imports of the session.
+ShadingGroups = {}
+# Files imported into the scene: path -> [size, mtime, content hash or
+# None]. Stored in the scene file info, see getImportedFiles().
+ImportedFiles = None
+ImportedFilesScene = None
+# Watch folder files that were not imported (not 3D meshes, broken):
+# path -> [size, mtime]. They are looked at again only once they change or
+# the options they were skipped with (SkippedFilesOptions) do.
+SkippedFiles = {}
+SkippedFilesOptions = None
+# Watch folder: new or changed files of the last import folder are
+# imported every WatchInterval seconds.
+g_watchFolder = False
+WatchInterval = 5.0
+WatchTimer = None
+# Background import: files are parsed on worker threads and meshes are
+# created on the main thread, g_importBatchSize at a time between UI
+# updates. BackgroundImport is the running job, see startBackgroundImport().
+g_backgroundImport = True
+g_importBatchSize = 8
+BackgroundImport = None
+BackgroundPollInterval = 0.05  # Seconds to wait for the parser.
 
 InitialDirectory = ""
 
@@ -20,18 +67,8 @@ ImportAnything = False
 
 g_Mesh_Index = 0  # For renaming purposes.
 
-VertexLayout = {
-    'pos': [0, 1, 2, 3],  # Can be 2 of 4
-    'nml': [4, 5, 6, 7],
-    'uvw': [8, 9, 10, 11],  # Can be only 1 of 3. Met 4, but not in use.
-    'posUpdated': False,
-    'nmlUpdated': False,
-    'uvwUpdated': False,
-    'autoMode': True,
-    'posCount': 0,
-    'nmlCount': 0,
-    'uvwCount': 0,
-}
+# Layout template. Every file is parsed with its own copy of it.
+VertexLayout = None
 
 # Globals additional.
 mdlscaler = 100
@@ -43,422 +80,662 @@ uvscaler = 1
 g_flipUV = 1
 g_normalizeUV = False
 g_reverseNormals = False
+g_weldVertexes = True  # Weld decoded arrays instead of polyMergeVertex/UV.
+g_cleanupMeshes = True  # Drop degenerate faces and unused vertexes.
+g_importNormals = True
+g_importColors = False  # Use COLOR attribute instead of white vertex colors.
+g_combineMeshes = False  # Import all files of a batch as few big meshes.
+CombineMaxVertexes = 4000000  # Vertex budget of a single combined mesh.
+WeldDistance = 0.01  # In scene units, after scaling.
+# Repeated draws of the same mesh and texture within a batch.
+DuplicateModes = ['Import', 'Instance', 'Skip']
+g_duplicateMode = 1
 
 g_enabler = True
 
-RegisterKey = None
+# Settings store: 'registry', 'json' or 'optionVar'. None - registry on
+# Windows, optionVars elsewhere. Set before the first import to change it.
+SettingsBackend = None
+SettingsFile = os.path.join(
+    os.path.expanduser("~"), "NinjaRipperMayaImportTools.json"
+)
+Settings = None
 
-def readULong(f):
-    return struct.unpack('<L', f.read(4))[0]
+def printDebug(text):
+    if g_debugMessages is True:
+        print(text)
 
 
-def readLong(f):
-    return struct.unpack('<l', f.read(4))[0]
+def printMessage(text):
+    mel.eval("print \"[NR]: {}\\n\"".format(text))
 
 
-def readFloat(f):
-    return struct.unpack('<f', f.read(4))[0]
+class RegistrySettings(object):
+    # HKCU\SOFTWARE\Autodesk\MayaPlugins\NinjaRipperMayaImportTools.
+    KeyPath = "SOFTWARE\\Autodesk\\MayaPlugins\\NinjaRipperMayaImportTools"
 
+    def __init__(self):
+        try:
+            self.key = reg.OpenKey(
+                reg.HKEY_CURRENT_USER, self.KeyPath, 0, reg.KEY_ALL_ACCESS
+            )
+        except WindowsError:
+            self.key = reg.CreateKey(reg.HKEY_CURRENT_USER, self.KeyPath)
 
-def readString(f):
-    s = ""
-    while True:
-        b = f.read(1)
-        if b == chr(0):
-            break
-        s = s + b
-    return s
+    def read(self, keyName, default):
+        try:
+            return reg.QueryValueEx(self.key, keyName)[0]
+        except WindowsError:
+            return default
 
+    def writeDword(self, keyName, val):
+        reg.SetValueEx(self.key, keyName, 0, reg.REG_DWORD, val)
 
-def printDebug(text):
-    if g_debugMessages is True:
-        print(text)
+    def writeString(self, keyName, val):
+        reg.SetValueEx(self.key, keyName, 0, reg.REG_SZ, val)
 
+    def flush(self):
+        pass
 
-def printMessage(text):
-    mel.eval("print \"[NR]: {}\\n\"".format(text))
 
+class JsonSettings(object):
+    # Plain file, e.g. for render nodes sharing one configuration.
+    def __init__(self, path):
+        self.path = path
+        self.values = {}
+        try:
+            with open(path) as f:
+                self.values = json.load(f)
+        except (EnvironmentError, ValueError):
+            pass
 
-def regReadFloat(keyName):
-    return float(regReadString(keyName))
+    def read(self, keyName, default):
+        return self.values.get(keyName, default)
 
+    def writeDword(self, keyName, val):
+        self.values[keyName] = int(val)
 
-def regReadDword(keyName):
-    result = 0
-    try:
-        result = reg.QueryValueEx(RegisterKey, keyName)[0]
-    except WindowsError:
-        result = 0
-    return result
+    def writeString(self, keyName, val):
+        self.values[keyName] = val
 
+    def flush(self):
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self.values, f, indent=1, sort_keys=True)
+        except EnvironmentError:
+            printMessage("Can't save settings to '{}'".format(self.path))
 
-def regReadString(keyName):
-    return regReadDword(keyName).encode('ascii', 'ignore')
 
+class OptionVarSettings(object):
+    # Maya preferences, available in batch mode too.
+    Prefix = "NinjaRipper_"
 
-def regReadBool(keyName):
-    return bool(regReadDword(keyName))
+    def read(self, keyName, default):
+        name = self.Prefix + keyName
+        if not cmds.optionVar(exists=name):
+            return default
+        return cmds.optionVar(q=name)
 
+    def writeDword(self, keyName, val):
+        cmds.optionVar(iv=(self.Prefix + keyName, int(val)))
 
-def regSetDword(keyName, val):
-    reg.SetValueEx(RegisterKey, keyName, 0, reg.REG_DWORD, val)
+    def writeString(self, keyName, val):
+        cmds.optionVar(sv=(self.Prefix + keyName, val))
 
+    def flush(self):
+        pass
 
-def regSetString(keyName, val):
-    reg.SetValueEx(RegisterKey, keyName, 0, reg.REG_SZ, val)
 
+def getSettings():
+    global Settings
 
-def regSetFloat(keyName, val):
-    regSetString(keyName, "{}".format(val))
+    if Settings is None:
+        backend = SettingsBackend or ('registry' if reg else 'optionVar')
+        if backend == 'registry':
+            Settings = RegistrySettings()
+        elif backend == 'json':
+            Settings = JsonSettings(SettingsFile)
+        else:
+            Settings = OptionVarSettings()
+    return Settings
 
 
-def regSetBool(keyName, val):
-    regSetDword(keyName, 1 if val else 0)
+def settingReadFloat(keyName, default=0.0):
+    return float(settingReadString(keyName, "{}".format(default)))
 
 
-def readRIPHeader(f):
-    return struct.unpack('<LLLLLLLL', f.read(32))
+def settingReadDword(keyName, default=0):
+    return getSettings().read(keyName, default)
 
 
-def updateVertexLayoutIndexes(t, baseIndex, count):
-    if t is None:
-        return
+def settingReadString(keyName, default=""):
+    return settingReadDword(keyName, default).encode('ascii', 'ignore')
 
-    global VertexLayout
 
-    keyUpdated = "{}Updated".format(t)
-    keyCount = "{}Count".format(t)
-    # printDebug(keyUpdated)
-    # printDebug(keyCount)
-    if VertexLayout[keyUpdated] is False:
-        for i in range(count):
-            printDebug("VertexLayout[{}][{}]".format(t, i))
-            VertexLayout[t][i] = baseIndex + i
-        VertexLayout[keyUpdated] = True
-        VertexLayout[keyCount] = count
-
-
-def readRIPVertexAttrib(f, count):
-    result = ''
-    types = {0: 'f', 1: 'L', 2: 'l'}
-    vertexAttributes = []
-
-    for i in range(count):
-        semantic = readString(f)
-        semanticIndex = readULong(f)
-        offset = readULong(f)
-        size = readULong(f)
-        typeMapElements = readULong(f)
-        for j in range(typeMapElements):
-            result += types.get(readULong(f), 1)
-
-        vertexAttributes.append([semantic, offset / 4, size / 4])
-
-    if VertexLayout['autoMode'] is True:  # AUTO recognition.
-        applyRecognitionLogic(vertexAttributes)
+def settingReadBool(keyName, default=False):
+    return bool(settingReadDword(keyName, default))
 
-    return result
 
+def settingSetDword(keyName, val):
+    getSettings().writeDword(keyName, val)
 
-def applyRecognitionLogic(vertexAttributes):
-    # vertexAttributes[i]:
-    # [0] semantic
-    # [1] index
-    # [2] count
 
-    shortNames = {'POSITION': 'pos', 'NORMAL': 'nml', 'TEXCOORD': 'uvw', 'SV_POSITION': 'pos'}
+def settingSetString(keyName, val):
+    getSettings().writeString(keyName, val)
 
-    printDebug("vertexAttributes Count: {}".format(len(vertexAttributes)))
 
-    for i in range(len(vertexAttributes)):
-        printDebug("vertexAttributes[{}] = {}, selected: {}".format(i, vertexAttributes[i], shortNames.get(vertexAttributes[i][0], None)))
-        updateVertexLayoutIndexes(
-            shortNames.get(vertexAttributes[i][0], None),
-            vertexAttributes[i][1],
-            vertexAttributes[i][2]
-        )
+def settingSetFloat(keyName, val):
+    settingSetString(keyName, "{}".format(val))
+
 
+def settingSetBool(keyName, val):
+    settingSetDword(keyName, 1 if val else 0)
 
-def readRIPStrings(f, count):
-    result = []
-    for i in range(count):
-        result.append(readString(f))
 
+def toMIntArray(values):
+    result = OpenMaya.MIntArray()
+    if len(values):
+        util = OpenMaya.MScriptUtil()
+        util.createFromList(values.tolist(), len(values))
+        result = OpenMaya.MIntArray(util.asIntPtr(), len(values))
     return result
 
 
-def readRIPFaces(f, count):
-    faceArray = OpenMaya.MIntArray()
-    for i in range(count):
-        data = struct.unpack('LLL', f.read(12))
-        for j in range(3):
-            faceArray.append(data[j])
+def toMFloatPointArray(points):
+    result = OpenMaya.MFloatPointArray()
+    if len(points):
+        util = OpenMaya.MScriptUtil()
+        util.createFromList(points.ravel().tolist(), points.size)
+        result = OpenMaya.MFloatPointArray(util.asFloat4Ptr(), len(points))
+    return result
 
-    return faceArray
 
+def toMFloatArray(values):
+    result = OpenMaya.MFloatArray()
+    if len(values):
+        util = OpenMaya.MScriptUtil()
+        util.createFromList(values.tolist(), len(values))
+        result = OpenMaya.MFloatArray(util.asFloatPtr(), len(values))
+    return result
 
-def generateVertexFromData(vertexData):
-    arr = [0.0, 0.0, 0.0, 0.0]
-    for i in range(VertexLayout['posCount']):  # Up to 4
-        arr[i] = vertexData[VertexLayout['pos'][i]]
-    return OpenMaya.MFloatPoint(arr[0], arr[1], arr[2], arr[3])
+
+def toMVectorArray(vectors):
+    result = OpenMaya.MVectorArray()
+    if len(vectors):
+        util = OpenMaya.MScriptUtil()
+        util.createFromList(vectors[:, :3].ravel().tolist(), len(vectors) * 3)
+        result = OpenMaya.MVectorArray(util.asFloat3Ptr(), len(vectors))
+    return result
 
 
-def generateNormalFromData(vertexData):
-    result = []
-    for i in range(VertexLayout['nmlCount']):  # Up to 4
-        result.append(vertexData[VertexLayout['nml'][i]])
+def toMColorArray(colors):
+    result = OpenMaya.MColorArray()
+    if len(colors):
+        util = OpenMaya.MScriptUtil()
+        util.createFromList(colors.ravel().tolist(), colors.size)
+        result = OpenMaya.MColorArray(util.asFloat4Ptr(), len(colors))
     return result
 
 
-def generateTexCoordFromData(vertexData, offset):
-    if VertexLayout['uvwCount'] > offset:
-        return vertexData[VertexLayout['uvw'][offset]]
-    return 0
+def isFileReadCorrect(ripMesh):
+    return (ripMesh.is3DModel() or ImportAnything) and ripMesh.isComplete()
 
 
-def readRIPVertexes(f, count, vertDict):
-    result = []
+def printRipInfo(ripMesh):
+    if g_debugMessages is not True:
+        return
 
-    Vert_array = OpenMaya.MFloatPointArray()
-    Normal_array = []
-    UArray = OpenMaya.MFloatArray()
-    VArray = OpenMaya.MFloatArray()
+    layout = ripMesh.layout
+    printDebug("RIP info for '{}'".format(ripMesh.path))
+    for i, attribute in enumerate(ripMesh.attributes):
+        printDebug("vertexAttributes[{}] = {}".format(i, attribute))
+    printDebug("VertexLayout['autoMode'] = {}".format(layout['autoMode']))
+    for t in ('pos', 'nml', 'uvw'):
+        for i in range(3):
+            printDebug(
+                "VertexLayout['{}'][{}] = {}".format(t, i, layout[t][i])
+            )
+    printDebug("mdlscaler = {}".format(mdlscaler))
+    printDebug("uvscaler = {}".format(uvscaler))
+    printDebug("g_Tex0_FileLev = {}".format(g_Tex0_FileLev))
+    printDebug("g_flipUV = {}".format(g_flipUV))
+    for t in ('pos', 'nml', 'uvw', 'clr'):
+        key = '{}Count'.format(t)
+        printDebug("VertexLayout['{}'] = {}".format(key, layout[key]))
 
-    rawStructSize = len(vertDict) * 4
-    for i in range(count):
-        vertexData = struct.unpack(vertDict, f.read(rawStructSize))
 
-        Vert_array.append(generateVertexFromData(vertexData))
-        Normal_array.append(generateNormalFromData(vertexData))
-        UArray.append(generateTexCoordFromData(vertexData, 0))
-        VArray.append(1 - generateTexCoordFromData(vertexData, 1))
+def getVertexLayout():
+    # Layout template for parsing: attributes that are not imported are not
+    # decoded (nor hashed or cached) at all.
+    layout = dict(VertexLayout)
+    layout['ignore'] = [
+        t for t, wanted in (('nml', g_importNormals), ('clr', g_importColors))
+        if not wanted
+    ]
+    return layout
 
-    # VertexData:
-    # [0] - Vert_array
-    # [1] - Normal_array
-    # [2] - UArray
-    # [3] - VArray
-    result.append(Vert_array)
-    result.append(Normal_array)
-    result.append(UArray)
-    result.append(VArray)
-    return result
 
+def getMeshCache():
+    global MeshCache
 
-def isFileReadCorrect(h, v, f):
-    is3DModel = VertexLayout['posCount'] >= 3 and VertexLayout['uvwCount'] == 2
-    isFileReadOK = h[3] == v[0].length() and h[2] == f.length() / 3
-    return (is3DModel or ImportAnything) and isFileReadOK
+    if g_meshCacheSize <= 0:
+        return None
+
+    maxSize = g_meshCacheSize * 1024 * 1024
+    if MeshCache is None or MeshCache.directory != g_meshCacheDirectory:
+        try:
+            MeshCache = core.RipMeshCache(g_meshCacheDirectory, maxSize)
+        except OSError:
+            printMessage(
+                "Can't create mesh cache in '{}'".format(g_meshCacheDirectory)
+            )
+            return None
+    MeshCache.maxSize = maxSize
+    return MeshCache
 
 
 def importRip(path):
-    global VertexLayout
-    global mdlscaler
-    global uvscaler
-    global g_flipUV
-    global g_Tex0_FileLev
+    initialize()
+    Stats.setFile(path)
+    try:
+        with Stats.stage('parse'):
+            ripMesh = core.readRIPFile(
+                path, getVertexLayout(), g_memoryMapFiles, getMeshCache()
+            )
+    except core.RipFormatError as e:
+        reportRipFormatError(path, e)
+        return
+
+    batch = newImportBatch()
+    importRipMesh(ripMesh, batch)
+    finishImportBatch(batch)
+
+
+def newImportBatch():
+    return {
+        'meshes': {},  # (content hash, texture) -> (mesh, shading group)
+        'members': {},  # shading group -> meshes to assign
+        'combine': [],  # [directory, texture, ripMesh] to be combined
+    }
+
+
+def finishImportBatch(batch):
+    if batch['combine']:
+        importCombined(batch)
 
-    # Reset this in case of loading multiple meshes in auto mode.
-    VertexLayout['posUpdated'] = False
-    VertexLayout['posCount'] = 0
-    VertexLayout['nmlUpdated'] = False
-    VertexLayout['nmlCount'] = 0
-    VertexLayout['uvwUpdated'] = False
-    VertexLayout['uvwCount'] = 0
-
-    with open(path, "rb") as f:
-        header = readRIPHeader(f)
-        # Header:
-        # [0] - signature
-        # [1] - version
-        # [2] - dwFacesCnt
-        # [3] - dwVertexesCnt
-        # [4] - VertexSize
-        # [5] - TextureFilesCnt
-        # [6] - ShaderFilesCnt
-        # [7] - VertexAttributesCnt
-
-        if header[0] != RipSignature or header[1] != RipFileVersion:
+    printMessage("Applying textures...")
+    assignMaterials(batch)
+
+
+def assignMaterials(batch):
+    Stats.setFile(None)
+    with Stats.stage('shading'):
+        for shadingGroup, members in batch['members'].items():
+            cmds.sets(members, e=True, forceElement=shadingGroup)
+    batch['members'] = {}
+
+
+def importRipFiles(paths):
+    initialize()
+    layout = getVertexLayout()
+    if g_useCatalog:
+        count = len(paths)
+        with Stats.stage('catalog'):
+            paths = core.filterRIPFiles(paths, layout, ImportAnything)
+        if count != len(paths):
             printMessage(
-                "Expected signature '{}' (got '{}')".format(
-                    RipSignature, signature
+                "Skipped {} non-3D or incomplete file(s)".format(
+                    count - len(paths)
                 )
             )
 
-            printMessage(
-                "Expected version '{}' (got '{}')".format(
-                    RipFileVersion, version
+    batch = newImportBatch()
+    imported = []
+
+    # Files are parsed in parallel, meshes are created here in file order.
+    # 'parse' is the time spent waiting for the parser, it is not added to
+    # file times as files are parsed in parallel.
+    ripFiles = core.readRIPFiles(
+        paths, layout, g_memoryMapFiles, g_parseWorkers,
+        cache=getMeshCache()
+    )
+    while True:
+        Stats.setFile(None)
+        with Stats.stage('parse'):
+            path, ripMesh, error = next(ripFiles, (None, None, None))
+        if path is None:
+            break
+        if error is not None:
+            reportRipFormatError(path, error)
+            continue
+
+        if importRipMesh(ripMesh, batch):
+            imported.append(path)
+
+    finishImportBatch(batch)
+    return imported
+
+
+def reportRipFormatError(path, error):
+    printMessage(error)
+    printMessage("File '{}' is not a RIP file".format(path))
+
+
+def importRipMesh(ripMesh, batch):
+    path = ripMesh.path
+    Stats.setFile(path, ripMesh.vertexCount(), ripMesh.faceCount())
+    printRipInfo(ripMesh)
+
+    if not isFileReadCorrect(ripMesh):
+        printMessage(
+            "File reading error: incomplete vertex/faces arrays " +
+            "or file not a 3D object. Use ripdump.exe if you want to " +
+            "get more information."
+        )
+        return False
+
+    texture = ripMesh.textureFile(g_Tex0_FileLev)
+    key = None
+    if DuplicateModes[g_duplicateMode] != 'Import':
+        with Stats.stage('hash'):
+            key = (ripMesh.contentHash(), texture)
+        original = batch['meshes'].get(key)
+        if original is not None and (
+            original[0] is None or cmds.objExists(original[0])
+        ):
+            with Stats.stage('instance'):
+                importDuplicate(original, path, batch)
+            return True
+
+    prepareRipMesh(ripMesh)
+
+    if g_combineMeshes:
+        # Copies would land at the same place in the combined mesh.
+        batch['combine'].append([os.path.dirname(path), texture, ripMesh])
+        if key is not None:
+            batch['meshes'][key] = (None, None)
+        return True
+
+    meshName = createMesh(ripMesh)
+    with Stats.stage('shading'):
+        shadingGroup = getShadingGroup(os.path.dirname(path), texture)
+    batch['members'].setdefault(shadingGroup, []).append(meshName)
+    if key is not None:
+        batch['meshes'][key] = (meshName, shadingGroup)
+    return True
+
+
+def prepareRipMesh(ripMesh):
+    with Stats.stage('transform'):
+        core.transformRipMesh(
+            ripMesh, mdlscaler, (g_ninjarotX, g_ninjarotY, g_ninjarotZ),
+            uvscaler, uvscaler * g_flipUV
+        )
+
+        if g_reverseNormals:
+            core.reverseWinding(ripMesh)
+
+    if g_weldVertexes:
+        with Stats.stage('weld'):
+            core.weldRipMesh(ripMesh, WeldDistance, WeldDistance)
+
+    # After welding: merged vertexes turn sliver faces into degenerate ones.
+    if g_cleanupMeshes:
+        with Stats.stage('cleanup'):
+            removed = core.cleanRipMesh(ripMesh)
+        if removed:
+            printDebug("Removed {} degenerate face(s)".format(removed))
+
+
+def createMesh(ripMesh):
+    with Stats.stage('convert'):
+        uvConnects = None
+        if ripMesh.uvFaces is not None:
+            uvConnects = toMIntArray(ripMesh.uvFaces)
+
+        arrays = (
+            toMFloatPointArray(ripMesh.positions),
+            toMIntArray(ripMesh.faces),
+            [toMFloatArray(ripMesh.u), toMFloatArray(ripMesh.v)],
+            uvConnects, getNormals(ripMesh), getColors(ripMesh)
+        )
+    return ImportToMaya(*arrays)
+
+
+def importCombined(batch):
+    # Meshes with the same texture go next to each other, so every texture
+    # covers one face range of a combined mesh.
+    items = sorted(batch['combine'], key=lambda item: item[:2])
+    batch['combine'] = []
+
+    chunks = [[]]
+    vertexCount = 0
+    for item in items:
+        count = item[2].vertexCount()
+        if chunks[-1] and vertexCount + count > CombineMaxVertexes:
+            chunks.append([])
+            vertexCount = 0
+        chunks[-1].append(item)
+        vertexCount += count
+
+    for chunk in chunks:
+        printMessage("Combining {} mesh(es)...".format(len(chunk)))
+        Stats.setFile(None)
+        with Stats.stage('combine'):
+            combined, sources = core.combineRipMeshes(
+                [item[2] for item in chunk]
+            )
+        Stats.setFile(
+            "Combined mesh of {} file(s)".format(len(chunk)),
+            combined.vertexCount(), combined.faceCount()
+        )
+        meshName = createMesh(combined)
+
+        for item, source in zip(chunk, sources):
+            if not source[2]:
+                continue
+            with Stats.stage('shading'):
+                shadingGroup = getShadingGroup(item[0], item[1])
+            batch['members'].setdefault(shadingGroup, []).append(
+                "{}.f[{}:{}]".format(
+                    meshName, source[1], source[1] + source[2] - 1
                 )
             )
 
-            printMessage("File '{}' is nor a RIP file".format(path))
-            return
-
-        # printDebug("*****ImportRip() File: " + path)
-        # printDebug("dwFacesCnt=" + str(dwFacesCnt))
-        # printDebug("dwVertexesCnt=" + str(dwVertexesCnt))
-        # printDebug("VertexAttributesCnt=" + str(VertexAttributesCnt))
-
-        # Read vertex attributes.
-        vertexStructDictionary = readRIPVertexAttrib(f, header[7])
-        # Read textures list (if present).
-        TextureFiles = readRIPStrings(f, header[5])
-        # Read shader list (if present).
-        ShaderFiles = readRIPStrings(f, header[6])
-        # Read mesh faces.
-        Face_array = readRIPFaces(f, header[2])
-        # Read vertexes data.
-        VertexData = readRIPVertexes(f, header[3], vertexStructDictionary)
-        # VertexData:
-        # [0] - Vert_array
-        # [1] - Normal_array
-        # [2] - UArray
-        # [3] - VArray
-
-    printDebug("RIP info for '{}'".format(path))
-    printDebug("VertexLayout['autoMode'] = {}".format(VertexLayout['autoMode']))
-    printDebug("VertexLayout['pos'][0] = {}".format(VertexLayout['pos'][0]))
-    printDebug("VertexLayout['pos'][1] = {}".format(VertexLayout['pos'][1]))
-    printDebug("VertexLayout['pos'][2] = {}".format(VertexLayout['pos'][2]))
-    printDebug("VertexLayout['nml'][0] = {}".format(VertexLayout['nml'][0]))
-    printDebug("VertexLayout['nml'][1] = {}".format(VertexLayout['nml'][1]))
-    printDebug("VertexLayout['nml'][2] = {}".format(VertexLayout['nml'][2]))
-    printDebug("VertexLayout['uvw'][0] = {}".format(VertexLayout['uvw'][0]))
-    printDebug("VertexLayout['uvw'][1] = {}".format(VertexLayout['uvw'][1]))
-    printDebug("VertexLayout['uvw'][2] = {}".format(VertexLayout['uvw'][2]))
-    printDebug("mdlscaler = {}".format(mdlscaler))
-    printDebug("uvscaler = {}".format(uvscaler))
-    printDebug("g_Tex0_FileLev = {}".format(g_Tex0_FileLev))
-    printDebug("g_flipUV = {}".format(g_flipUV))
-    printDebug("VertexLayout['posCount'] = {}".format(VertexLayout['posCount']))
-    printDebug("VertexLayout['nmlCount'] = {}".format(VertexLayout['nmlCount']))
-    printDebug("VertexLayout['uvwCount'] = {}".format(VertexLayout['uvwCount']))
-
-    textureFile = "setka.png"
-    if TextureFiles:
-        textureFile = TextureFiles[g_Tex0_FileLev]
-
-    if isFileReadCorrect(header, VertexData, Face_array):
-        ImportToMaya(
-            VertexData[0], Face_array, [VertexData[2], VertexData[3]],
-            os.path.dirname(path), textureFile
+        # Mapping of face/vertex ranges back to .rip files.
+        cmds.addAttr(meshName, ln='ninjaRipSources', dt='string')
+        cmds.setAttr(
+            "{}.ninjaRipSources".format(meshName), json.dumps(sources),
+            type='string'
         )
-        return
 
-    printMessage(
-        "File reading error: incomplete vertex/faces arrays " +
-        "or file not a 3D object. Use ripdump.exe if you want to " + 
-        "get more information."
-    )
 
+def getNormals(ripMesh):
+    # Returns (normals, faceList, vertexList) for MFnMesh.setFaceVertexNormals
+    # or (normals, None, vertexList) for MFnMesh.setVertexNormals.
+    if not g_importNormals or ripMesh.normals.shape[1] < 3:
+        return None
 
-def ImportToMaya(vertexArray, polygonConnects, uvArray, texturePath, texture):
-    global g_Mesh_Index
+    if ripMesh.sourceFaces is None:
+        return (
+            toMVectorArray(ripMesh.normals), None,
+            toMIntArray(numpy.arange(ripMesh.vertexCount()))
+        )
 
-    printMessage("Creating mesh...")
-    polygonCounts = OpenMaya.MIntArray(polygonConnects.length() / 3, 3)
-    mesh = OpenMaya.MFnMesh()
-    transform = mesh.create(
-        vertexArray.length(), polygonCounts.length(), vertexArray,
-        polygonCounts, polygonConnects
+    return (
+        toMVectorArray(ripMesh.normals[ripMesh.sourceFaces]),
+        toMIntArray(numpy.arange(ripMesh.faceCount()).repeat(3)),
+        toMIntArray(ripMesh.faces)
     )
 
-    printDebug("connects cnt {}".format(polygonConnects.length()))
-    printDebug("cnt {}".format(polygonCounts.length()))
-    printDebug("u cnt {}".format(uvArray[0].length()))
-    printDebug("v cnt {}".format(uvArray[1].length()))
 
-    # UV map.
-    printMessage("Mapping UVs...")
-    mesh.setUVs(uvArray[0], uvArray[1])
+def getColors(ripMesh):
+    # Same layout as getNormals(). Meshes without (or with ignored) colors
+    # get plain white.
+    if not g_importColors or ripMesh.colors is None:
+        colors = numpy.ones((ripMesh.vertexCount(), 4), numpy.float32)
+        return (
+            toMColorArray(colors), None,
+            toMIntArray(numpy.arange(ripMesh.vertexCount()))
+        )
 
-    try:
-        mesh.assignUVs(polygonCounts, polygonConnects)
-    except RuntimeError:
-        printDebug("mesh.assignUVs() failed. Assign manually...")
-        for i in range(0, polygonConnects.length()):
-            try:
-                mesh.assignUV(i / 3, i % 3, polygonConnects[i])
-            except RuntimeError:
-                printMessage("AssignUV failed: " + 
-                            "[{}] = {}".format(i, polygonConnects[i]))
+    if ripMesh.sourceFaces is None:
+        return (
+            toMColorArray(ripMesh.colors), None,
+            toMIntArray(numpy.arange(ripMesh.vertexCount()))
+        )
 
-    # Rename mesh.
-    printMessage("Renaming mesh...")
-    transformDagPath = OpenMaya.MDagPath()
-    OpenMaya.MDagPath.getAPathTo(transform, transformDagPath)
-    meshName = cmds.rename(
-        transformDagPath.fullPathName(), "NinjaMesh_{}".format(g_Mesh_Index)
+    return (
+        toMColorArray(ripMesh.colors[ripMesh.sourceFaces]),
+        toMIntArray(numpy.arange(ripMesh.faceCount()).repeat(3)),
+        toMIntArray(ripMesh.faces)
     )
+
+
+def importDuplicate(original, path, batch):
+    global g_Mesh_Index
+
+    originalName, shadingGroup = original
+    if DuplicateModes[g_duplicateMode] == 'Skip' or originalName is None:
+        printMessage(
+            "Skipped '{}': same mesh is already imported".format(path)
+        )
+        return
+
+    meshName = cmds.instance(
+        originalName, name="NinjaMesh_{}".format(g_Mesh_Index)
+    )[0]
     g_Mesh_Index = g_Mesh_Index + 1
+    batch['members'].setdefault(shadingGroup, []).append(meshName)
+    cmds.select(cl=True)
+    print("Instanced mesh '{}' as '{}'".format(originalName, meshName))
 
-    # Apply textures.
-    printMessage("Applying textures...")
+
+def getShadingGroup(texturePath, texture):
+    fullPath = "{}/{}".format(texturePath, texture)
+    shadingGroup = ShadingGroups.get(fullPath)
+    if shadingGroup is not None and cmds.objExists(shadingGroup):
+        return shadingGroup
+
+    printMessage("Creating material for '{}'...".format(texture))
     shader = cmds.shadingNode(
         "lambert", name="NinjaTexture_{}".format(g_Mesh_Index), asShader=True
     )
-
-    cmds.select(meshName)
-    cmds.hyperShade(assign=shader)
+    shadingGroup = cmds.sets(
+        renderable=True, noSurfaceShader=True, empty=True,
+        name="{}SG".format(shader)
+    )
+    cmds.connectAttr(
+        "{}.outColor".format(shader), "{}.surfaceShader".format(shadingGroup)
+    )
 
     colorMap = cmds.shadingNode(
-        "file", name="{}_colorMap".format(texture), asTexture=True
+        "file", name="{}_colorMap".format(os.path.basename(texture)),
+        asTexture=True
     )
 
     cmds.connectAttr(
         "{}.outColor".format(colorMap), "{}.color".format(shader)
     )
     cmds.setAttr(
-        "{}.fileTextureName".format(colorMap),
-        "{}/{}".format(texturePath, texture), type='string'
-    )
-
-    # Set vertex color to White.
-    printMessage("Forcing vertex color to white...")
-    cmds.select(meshName)
-    cmds.polyColorPerVertex(cdo=True, rgb=[1, 1, 1])
-
-    # Apply transformations.
-    printMessage("Applying transformations...")
-    cmds.setAttr("{}.rotateX".format(meshName), g_ninjarotX)
-    cmds.setAttr("{}.rotateY".format(meshName), g_ninjarotY)
-    cmds.setAttr("{}.rotateZ".format(meshName), g_ninjarotZ)
-    cmds.setAttr("{}.scaleX".format(meshName), mdlscaler)
-    cmds.setAttr("{}.scaleY".format(meshName), mdlscaler)
-    cmds.setAttr("{}.scaleZ".format(meshName), mdlscaler)
-
-    # Freeze transformations.
-    printMessage("Zeroing new transform values...")
-    cmds.makeIdentity(apply=True, t=1, r=1, s=1, n=0, pn=1)
-
-    # Scale UVs.
-    printMessage("Scaling UVs...")
-    uvs = cmds.polyListComponentConversion(meshName, tuv=True)
-    cmds.select(uvs)
-    cmds.polyEditUV(su=uvscaler, sv=uvscaler*g_flipUV)
+        "{}.fileTextureName".format(colorMap), fullPath, type='string'
+    )
 
-    # Normalize UV.
-    if g_normalizeUV:
-        printMessage("Normalizing UVs...")
-        cmds.polyNormalizeUV(nt=1, pa=True, centerOnTile=True)
+    ShadingGroups[fullPath] = shadingGroup
+    return shadingGroup
 
-    # Merge duplicates.
-    printMessage("Removing duplicate vertex...")
-    cmds.select(cl=True)
-    cmds.select(meshName)
-    cmds.polyMergeVertex(d=0.01, am=True, ch=1)
-    cmds.polyMergeUV(d=0.01, ch=True)
 
-    # Reverse normals (First met in MWR)
-    if g_reverseNormals:
-        printMessage("Reversing normals...")
-        cmds.select(cl=True)
-        cmds.select(meshName)
-        cmds.polyNormal(meshName, ch=1)
+def ImportToMaya(vertexArray, polygonConnects, uvArray, uvConnects=None,
+                 normals=None, colors=None):
+    global g_Mesh_Index
+
+    if uvConnects is None:
+        uvConnects = polygonConnects
+
+    # Progress goes to printDebug(): printMessage() costs a mel.eval().
+    printDebug("Creating mesh...")
+    with Stats.stage('create'):
+        polygonCounts = OpenMaya.MIntArray(polygonConnects.length() / 3, 3)
+        mesh = OpenMaya.MFnMesh()
+        transform = mesh.create(
+            vertexArray.length(), polygonCounts.length(), vertexArray,
+            polygonCounts, polygonConnects
+        )
+
+    printDebug("connects cnt {}".format(polygonConnects.length()))
+    printDebug("cnt {}".format(polygonCounts.length()))
+    printDebug("u cnt {}".format(uvArray[0].length()))
+    printDebug("v cnt {}".format(uvArray[1].length()))
+
+    # UV map.
+    printDebug("Mapping UVs...")
+    with Stats.stage('uv'):
+        mesh.setUVs(uvArray[0], uvArray[1])
+
+        try:
+            mesh.assignUVs(polygonCounts, uvConnects)
+        except RuntimeError:
+            printDebug("mesh.assignUVs() failed. Assign manually...")
+            for i in range(0, uvConnects.length()):
+                try:
+                    mesh.assignUV(i / 3, i % 3, uvConnects[i])
+                except RuntimeError:
+                    printMessage("AssignUV failed: " + 
+                                "[{}] = {}".format(i, uvConnects[i]))
+
+    # Normals.
+    if normals is not None:
+        printDebug("Setting normals...")
+        with Stats.stage('normals'):
+            if normals[1] is None:
+                mesh.setVertexNormals(normals[0], normals[2])
+            else:
+                mesh.setFaceVertexNormals(normals[0], normals[1], normals[2])
+
+    # Rename mesh.
+    printDebug("Renaming mesh...")
+    with Stats.stage('rename'):
+        transformDagPath = OpenMaya.MDagPath()
+        OpenMaya.MDagPath.getAPathTo(transform, transformDagPath)
+        meshName = cmds.rename(
+            transformDagPath.fullPathName(),
+            "NinjaMesh_{}".format(g_Mesh_Index)
+        )
+        g_Mesh_Index = g_Mesh_Index + 1
+
+    # Textures are assigned for the whole batch, see finishImportBatch().
+
+    # Vertex colors.
+    if colors is not None:
+        printDebug("Setting vertex colors...")
+        with Stats.stage('colors'):
+            if colors[1] is None:
+                mesh.setVertexColors(colors[0], colors[2])
+            else:
+                mesh.setFaceVertexColors(colors[0], colors[1], colors[2])
+            mesh.findPlug("displayColors").setBool(True)
+
+    # Scale, rotation and UV scale/flip are already applied to the arrays.
+
+    # Normalize UV.
+    if g_normalizeUV:
+        printDebug("Normalizing UVs...")
+        with Stats.stage('normalize'):
+            cmds.select(cmds.polyListComponentConversion(meshName, tuv=True))
+            cmds.polyNormalizeUV(nt=1, pa=True, centerOnTile=True)
+
+    # Merge duplicates (unless already welded by the parser).
+    if not g_weldVertexes:
+        printDebug("Removing duplicate vertex...")
+        with Stats.stage('merge'):
+            cmds.select(cl=True)
+            cmds.select(meshName)
+            cmds.polyMergeVertex(d=WeldDistance, am=True, ch=1)
+            cmds.polyMergeUV(d=WeldDistance, ch=True)
 
     cmds.select(cl=True)
-    print("Import done for mesh '{}'".format(meshName))
+    printDebug("Import done for mesh '{}'".format(meshName))
+    return meshName
 
 
 def changeVertexRecognition(isManual):
@@ -469,8 +746,7 @@ def changeVertexRecognition(isManual):
     cmds.frameLayout('NR_VertexLayout_TexCoord', edit=True, en=isManual)
 
 
-def onImportButtonPressed():
-    global InitialDirectory
+def readImportWindow():
     global VertexLayout
 
     global mdlscaler
@@ -483,7 +759,16 @@ def onImportButtonPressed():
     global g_flipUV
     global g_normalizeUV
     global g_reverseNormals
+    global g_weldVertexes
+    global g_cleanupMeshes
+    global g_importNormals
+    global g_combineMeshes
+    global g_importColors
     global ImportAnything
+    global g_duplicateMode
+    global g_printTimings
+    global g_backgroundImport
+    global g_importBatchSize
 
     mdlscaler = cmds.floatField('NR_TransformScale', query=True, v=True)
     g_ninjarotX = cmds.floatField('NR_TransformRotateX', query=True, v=True)
@@ -499,7 +784,24 @@ def onImportButtonPressed():
 
     g_normalizeUV = cmds.checkBox('NR_MiscNormalizeUV', query=True, v=True)
     g_reverseNormals = cmds.checkBox('NR_MiscReverseNormals', query=True, v=True)
+    g_importNormals = cmds.checkBox('NR_MiscImportNormals', query=True, v=True)
+    g_importColors = cmds.checkBox('NR_MiscImportColors', query=True, v=True)
+    g_weldVertexes = cmds.checkBox('NR_MiscWeldVertexes', query=True, v=True)
+    g_cleanupMeshes = cmds.checkBox(
+        'NR_MiscCleanupMeshes', query=True, v=True
+    )
+    g_combineMeshes = cmds.checkBox(
+        'NR_MiscCombineMeshes', query=True, v=True
+    )
     ImportAnything = cmds.checkBox('NR_MiscImportAnything', query=True, v=True)
+    g_duplicateMode = cmds.optionMenu(
+        'NR_MiscDuplicates', query=True, sl=True
+    ) - 1
+    g_printTimings = cmds.checkBox('NR_MiscPrintTimings', query=True, v=True)
+    g_backgroundImport = cmds.checkBox(
+        'NR_MiscBackgroundImport', query=True, v=True
+    )
+    g_importBatchSize = cmds.intField('NR_MiscBatchSize', query=True, v=True)
 
     if VertexLayout['autoMode'] is False:
         VertexLayout['pos'][0] = cmds.intField(
@@ -527,10 +829,16 @@ def onImportButtonPressed():
             'NR_VertexLayout_TCV', query=True, v=True
         )
 
+
+def onImportButtonPressed():
+    global InitialDirectory
+
+    initialize()
+    readImportWindow()
     saveOptions()
 
     fileList = cmds.fileDialog2(
-        fileMode=4, fileFilter="RIP Files (*.rip)",
+        fileMode=4, fileFilter="RIP Files (*.rip *.nrm)",
         caption="Select .rip files...", dir=InitialDirectory
     )
 
@@ -540,12 +848,387 @@ def onImportButtonPressed():
 
     for i in range(0, len(fileList)):
         fileList[i] = fileList[i].encode('ascii', 'ignore')
-        importRip(fileList[i])
 
     InitialDirectory = os.path.dirname(fileList[0])
+    importFiles(fileList, lambda imported, complete: rememberImportedFiles(
+        dict((path, None) for path in imported)
+    ))
+
+
+def importFiles(paths, onFinished, hashes=None):
+    # Import started from the window or the watch folder. onFinished gets
+    # the imported paths once all meshes are created, and False if the
+    # import was cancelled before every file was looked at. 'hashes', if
+    # given, gets the content hash of every file read that is not in it
+    # yet; a background import hashes files on the reader thread.
+    if BackgroundImport is not None:
+        printMessage("Another import is running")
+        return
+
+    if g_backgroundImport and not cmds.about(batch=True):
+        startBackgroundImport(paths, onFinished, hashes)
+        return
+
+    imported = importFilesWithReport(paths)
+    if hashes is not None:
+        hashFiles([path for path in imported if path not in hashes], hashes)
+    onFinished(imported, True)
     printMessage("Import done.")
 
 
+def hashFiles(paths, hashes):
+    for path in paths:
+        try:
+            hashes[path] = core.fileContentHash(path)
+        except EnvironmentError:
+            pass  # Removed meanwhile, remembered without a hash.
+
+
+def startBackgroundImport(paths, onFinished, hashes=None):
+    global BackgroundImport
+    global Stats
+
+    Stats = core.ImportStats() if g_printTimings else core.NoStats
+    BackgroundImport = {
+        'paths': paths,
+        'results': queue.Queue(max(g_importBatchSize, 1) * 2),
+        'batch': newImportBatch(),
+        'imported': [],
+        'total': len(paths),
+        'done': 0,
+        'cancelled': False,
+        'onFinished': onFinished,
+        # Resolved here: creating the cache may report errors through mel,
+        # which only works on the main thread.
+        'cache': getMeshCache(),
+        'layout': getVertexLayout(),
+        'hashes': hashes,
+        'error': None,
+    }
+    thread = threading.Thread(
+        target=readInBackground, args=(BackgroundImport,)
+    )
+    thread.daemon = True
+    thread.start()
+
+    updateImportProgress(BackgroundImport)
+    scheduleBackgroundImport(0)
+
+
+def readInBackground(job):
+    # Worker side: catalog filtering and parsing. Results go to the
+    # bounded queue, None marks the end. Nothing here may call Maya, an
+    # unexpected error is kept for the main thread to report.
+    try:
+        paths = job['paths']
+        if g_useCatalog:
+            paths = core.filterRIPFiles(paths, job['layout'], ImportAnything)
+            job['total'] = len(paths)
+
+        ripFiles = core.readRIPFiles(
+            paths, job['layout'], g_memoryMapFiles, g_parseWorkers,
+            cache=job['cache']
+        )
+        try:
+            for result in ripFiles:
+                if job['cancelled']:
+                    break
+                path, ripMesh = result[:2]
+                hashes = job['hashes']
+                if hashes is not None and ripMesh is not None and \
+                        path not in hashes:
+                    hashFiles([path], hashes)
+                job['results'].put(result)
+        finally:
+            ripFiles.close()
+    except Exception:
+        job['error'] = traceback.format_exc()
+        job['cancelled'] = True
+    finally:
+        job['results'].put(None)
+
+
+def scheduleBackgroundImport(delay):
+    import maya.utils
+
+    if delay <= 0:
+        maya.utils.executeDeferred(processBackgroundImport)
+        return
+    timer = threading.Timer(
+        delay, maya.utils.executeDeferred, [processBackgroundImport]
+    )
+    timer.daemon = True
+    timer.start()
+
+
+def processBackgroundImport():
+    # Main thread side: creates up to g_importBatchSize meshes, then gives
+    # control back to Maya until the next deferred call.
+    job = BackgroundImport
+    if job is None:
+        return
+
+    created = 0
+    try:
+        while created < max(g_importBatchSize, 1):
+            try:
+                result = job['results'].get_nowait()
+            except queue.Empty:
+                break
+            if result is None:
+                finishBackgroundImport(job)
+                return
+            if job['cancelled']:
+                continue  # Drain, so the reader thread can stop.
+
+            path, ripMesh, error = result
+            job['done'] += 1
+            if error is not None:
+                reportRipFormatError(path, error)
+                continue
+            if importRipMesh(ripMesh, job['batch']):
+                job['imported'].append(path)
+            created += 1
+
+        if not g_combineMeshes:
+            assignMaterials(job['batch'])
+        updateImportProgress(job)
+    except Exception:
+        # Stop the reader and finish with what is imported so far.
+        job['cancelled'] = True
+        scheduleBackgroundImport(0)
+        raise
+    scheduleBackgroundImport(0 if created else BackgroundPollInterval)
+
+
+def finishBackgroundImport(job):
+    global BackgroundImport
+    global Stats
+
+    try:
+        finishImportBatch(job['batch'])
+        for line in Stats.report():
+            print(line)
+    finally:
+        Stats = core.NoStats
+        BackgroundImport = None
+        updateImportProgress(None)
+
+    if job['error'] is not None:
+        print(job['error'])
+        printMessage("Import stopped by an error, {} of {} file(s)".format(
+            job['done'], job['total']
+        ))
+    elif job['cancelled']:
+        printMessage("Import cancelled, {} of {} file(s) done.".format(
+            job['done'], job['total']
+        ))
+    else:
+        printMessage("Import done.")
+    job['onFinished'](job['imported'], not job['cancelled'])
+
+
+def cancelBackgroundImport():
+    if BackgroundImport is not None:
+        BackgroundImport['cancelled'] = True
+
+
+def updateImportProgress(job):
+    if not cmds.window('NR_ImportWindow', exists=True):
+        return
+
+    if job is None:
+        cmds.progressBar('NR_ImportProgress', edit=True, progress=0)
+        cmds.button('NR_CancelImport', edit=True, en=False)
+        cmds.button('importButton', edit=True, en=True)
+        return
+
+    cmds.progressBar(
+        'NR_ImportProgress', edit=True, maxValue=max(job['total'], 1),
+        progress=job['done']
+    )
+    cmds.button('NR_CancelImport', edit=True, en=True)
+    cmds.button('importButton', edit=True, en=False)
+
+
+def importFilesWithReport(paths):
+    # importRipFiles() with timings printed at the end, if enabled.
+    global Stats
+
+    Stats = core.ImportStats() if g_printTimings else core.NoStats
+    try:
+        return importRipFiles(paths)
+    finally:
+        for line in Stats.report():
+            print(line)
+        Stats = core.NoStats
+
+
+def getImportedFiles():
+    # Reloaded from the scene file info whenever another scene is open.
+    global ImportedFiles
+    global ImportedFilesScene
+
+    scene = cmds.file(q=True, sceneName=True)
+    if ImportedFiles is None or scene != ImportedFilesScene:
+        ImportedFiles = {}
+        ImportedFilesScene = scene
+        values = cmds.fileInfo('ninjaRipperImportedFiles', q=True)
+        if values:
+            try:
+                ImportedFiles = json.loads(
+                    zlib.decompress(base64.b64decode(values[0]))
+                )
+            except (TypeError, ValueError, zlib.error):
+                printMessage("Can't read the list of imported files")
+    return ImportedFiles
+
+
+def rememberImportedFiles(states):
+    # states: path -> [size, mtime, content hash] or None (state is taken
+    # from the file, without a hash).
+    if not states:
+        return
+
+    importedFiles = getImportedFiles()
+    for path, state in states.items():
+        if state is None:
+            try:
+                state = core.fileState(path) + [None]
+            except OSError:
+                continue
+        importedFiles[os.path.normpath(path)] = state
+
+    # Base64: fileInfo escapes quotes of plain JSON.
+    cmds.fileInfo(
+        'ninjaRipperImportedFiles',
+        base64.b64encode(zlib.compress(json.dumps(importedFiles).encode()))
+    )
+
+
+def getSkippedFiles():
+    # Forgotten when the options that decide what gets imported change.
+    global SkippedFilesOptions
+
+    options = json.dumps([ImportAnything, VertexLayout], sort_keys=True)
+    if options != SkippedFilesOptions:
+        SkippedFiles.clear()
+        SkippedFilesOptions = options
+    return SkippedFiles
+
+
+def getWatchFolder():
+    # Files are selected inside a frame folder, new frames appear next to
+    # it.
+    folder = InitialDirectory
+    if os.path.basename(folder).startswith(('_Frame', '_Forced')):
+        folder = os.path.dirname(folder)
+    return folder
+
+
+def syncWatchFolder():
+    # Import .rip files of the watch folder that are new or changed since
+    # they were imported. Unchanged size/mtime skips a file without reading
+    # it, a new mtime with the same content hash only updates the record.
+    initialize()
+    if BackgroundImport is not None:
+        return  # Files of the running import are not remembered yet.
+    if cmds.window('NR_ImportWindow', exists=True):
+        readImportWindow()
+
+    folder = os.path.normpath(getWatchFolder())
+    if not getWatchFolder() or not os.path.isdir(folder):
+        printMessage("Nothing to watch, import some files first")
+        return
+
+    importedFiles = getImportedFiles()
+    known = dict(importedFiles)
+    known.update(getSkippedFiles())
+    modified = core.findModifiedFiles(core.findRIPFiles(folder), known)
+    if not modified:
+        return
+
+    paths = sorted(modified)
+    if g_useCatalog:
+        paths = core.filterRIPFiles(
+            paths, getVertexLayout(), ImportAnything
+        )
+        SkippedFiles.update(
+            (path, modified[path]) for path in set(modified) - set(paths)
+        )
+
+    # Only files imported before are hashed here, to tell a new mtime from
+    # new content. New files are hashed by the import, off the main thread
+    # when it runs in the background.
+    touched = {}
+    changed = {}
+    hashes = {}
+    for path in paths:
+        entry = importedFiles.get(path)
+        if entry is not None:
+            hashFiles([path], hashes)
+            if entry[2] is not None and entry[2] == hashes.get(path):
+                touched[path] = modified[path] + [entry[2]]
+                continue
+        changed[path] = modified[path]
+    rememberImportedFiles(touched)
+    if not changed:
+        return
+
+    printMessage("Importing {} new file(s) from '{}'...".format(
+        len(changed), folder
+    ))
+    def onFinished(imported, complete):
+        rememberImportedFiles(dict(
+            (path, changed[path] + [hashes.get(path)]) for path in imported
+        ))
+        imported = set(imported)
+        for path in imported:
+            SkippedFiles.pop(path, None)
+        if complete:
+            # Not a mesh or broken: wait until the file changes.
+            SkippedFiles.update(
+                (path, changed[path]) for path in changed
+                if path not in imported
+            )
+
+    importFiles(sorted(changed), onFinished, hashes)
+
+
+def setWatchFolder(enabled):
+    global g_watchFolder
+    global WatchTimer
+
+    g_watchFolder = enabled
+    if WatchTimer is not None:
+        WatchTimer.cancel()
+        WatchTimer = None
+    if enabled:
+        scheduleWatch(0)
+
+
+def scheduleWatch(delay):
+    # The timer thread only queues the scan for Maya's main thread.
+    global WatchTimer
+    import maya.utils
+
+    WatchTimer = threading.Timer(
+        delay, maya.utils.executeDeferred, [onWatchTimer]
+    )
+    WatchTimer.daemon = True
+    WatchTimer.start()
+
+
+def onWatchTimer():
+    if not g_watchFolder:
+        return
+    try:
+        syncWatchFolder()
+    finally:
+        if g_watchFolder:
+            scheduleWatch(WatchInterval)
+
+
 def createMenu():
     cmds.setParent(mel.eval("$temp1=$gMainWindow"))
 
@@ -555,7 +1238,13 @@ def createMenu():
     menu = cmds.menu('NR_ImportMenu', label='Ninja Ripper', tearOff=True)
 
     cmds.menuItem(
-        label='Import RIP v4', c="cmds.showWindow('NR_ImportWindow')"
+        label='Import RIP v4',
+        c="NinjaRipperMayaImportTools.showImportWindow()"
+    )
+
+    cmds.menuItem(
+        label='Import New Files',
+        c="NinjaRipperMayaImportTools.syncWatchFolder()"
     )
 
     cmds.menuItem(
@@ -701,10 +1390,60 @@ def createImportWindow():
         'NR_MiscReverseNormals', label="Reverse normals",
         ann="Reverse normals"
     )
+    cmds.checkBox(
+        'NR_MiscImportNormals', label="Import normals",
+        ann="Use normals stored in the file instead of computed ones"
+    )
+    cmds.checkBox(
+        'NR_MiscImportColors', label="Import vertex colors",
+        ann="Use COLOR vertex attribute (if present) instead of white"
+    )
+    cmds.checkBox(
+        'NR_MiscWeldVertexes', label="Weld vertexes",
+        ann="Merge duplicate vertexes and UVs while reading the file" +
+            " instead of polyMergeVertex/polyMergeUV (no history)"
+    )
+    cmds.checkBox(
+        'NR_MiscCleanupMeshes', label="Clean up meshes",
+        ann="Drop degenerate faces and vertexes no face uses before" +
+            " building meshes"
+    )
+    cmds.checkBox(
+        'NR_MiscCombineMeshes', label="Combine meshes",
+        ann="Import all selected files as a few big meshes, one material" +
+            " per texture"
+    )
     cmds.checkBox(
         'NR_MiscImportAnything', label='Import anything',
         ann='Do not ignore non-3D objects(incomplete pos/nml/uv coords)'
     )
+    cmds.checkBox(
+        'NR_MiscPrintTimings', label="Print timings",
+        ann="Print time spent in every import stage after import"
+    )
+    cmds.checkBox(
+        'NR_MiscBackgroundImport', label="Import in background",
+        ann="Keep Maya responsive: parse on worker threads and create" +
+            " meshes a few at a time"
+    )
+    cmds.rowLayout(nc=2, columnAlign2=['right', 'left'], adj=2)
+    cmds.text(label="Meshes per update:")
+    cmds.intField('NR_MiscBatchSize', min=1)
+    cmds.setParent('..')
+    cmds.checkBox(
+        'NR_MiscWatchFolder', label="Watch folder",
+        ann="Keep importing new and changed .rip files from the folder of" +
+            " the last import",
+        onc="NinjaRipperMayaImportTools.setWatchFolder(True)",
+        ofc="NinjaRipperMayaImportTools.setWatchFolder(False)"
+    )
+
+    cmds.optionMenu(
+        'NR_MiscDuplicates', label="Duplicates:",
+        ann="What to do with repeated draws of the same mesh and texture"
+    )
+    for mode in DuplicateModes:
+        cmds.menuItem(label=mode)
 
     cmds.setParent('..')
 
@@ -716,6 +1455,15 @@ def createImportWindow():
         c="NinjaRipperMayaImportTools.onImportButtonPressed()"
     )
 
+    # Background import progress.
+    progressRow = cmds.rowLayout(nc=2, adj=1)
+    cmds.progressBar('NR_ImportProgress')
+    cmds.button(
+        'NR_CancelImport', label='Cancel', en=False,
+        c="NinjaRipperMayaImportTools.cancelBackgroundImport()"
+    )
+    cmds.setParent('..')
+
     # Setup form.
     cmds.formLayout(formMain, edit=True, attachForm=[
             (vertexLayoutGroup, "left", 4), (vertexLayoutGroup, "top", 4),
@@ -726,7 +1474,9 @@ def createImportWindow():
 
             (miscGroup, "right", 4),
 
-            (importButton, "right", 4), (importButton, "bottom", 4),
+            (importButton, "right", 4),
+
+            (progressRow, "right", 4), (progressRow, "bottom", 4),
         ], attachControl=[
             (transformationsGroup, "left", 4, vertexLayoutGroup),
 
@@ -735,6 +1485,9 @@ def createImportWindow():
 
             (importButton, "top", 4, miscGroup),
             (importButton, "left", 4, vertexLayoutGroup),
+
+            (progressRow, "top", 4, importButton),
+            (progressRow, "left", 4, vertexLayoutGroup),
         ]
     )
 
@@ -743,8 +1496,6 @@ def loadOptions():
     global VertexLayout
     global InitialDirectory
 
-    global VertexLayout
-
     global mdlscaler
     global g_ninjarotX
     global g_ninjarotY
@@ -755,34 +1506,54 @@ def loadOptions():
     global g_flipUV
     global g_normalizeUV
     global g_reverseNormals
+    global g_weldVertexes
+    global g_cleanupMeshes
+    global g_importNormals
+    global g_combineMeshes
+    global g_importColors
     global ImportAnything
-
-    VertexLayout['autoMode'] = regReadBool('NR_AutoMode')
-    InitialDirectory = regReadString('InitialDirectory')
-
-    # VertexLayout['pos'][0] = regReadDword('NR_VertexLayout_PosX')
-    # VertexLayout['pos'][2] = regReadDword('NR_VertexLayout_PosY')
-    # VertexLayout['pos'][3] = regReadDword('NR_VertexLayout_PosZ')
-
-    VertexLayout['nml'][0] = regReadDword('NR_VertexLayout_NmlX')
-    VertexLayout['nml'][1] = regReadDword('NR_VertexLayout_NmlY')
-    VertexLayout['nml'][2] = regReadDword('NR_VertexLayout_NmlZ')
-    VertexLayout['uvw'][0] = regReadDword('NR_VertexLayout_TCU')
-    VertexLayout['uvw'][1] = regReadDword('NR_VertexLayout_TCV')
-
-    mdlscaler = regReadFloat('NR_TransformScale')
-    g_ninjarotX = regReadFloat('NR_TransformRotateX')
-    g_ninjarotY = regReadFloat('NR_TransformRotateY')
-    g_ninjarotZ = regReadFloat('NR_TransformRotateZ')
-    uvscaler = regReadFloat('NR_TransformUVScale')
-
-    g_Tex0_FileLev = regReadDword('NR_MiscTextureNumber')
-    g_flipUV = regReadDword('NR_MiscFlipUV')
-    g_normalizeUV = regReadBool('NR_MiscNormalizeUV')
-    g_reverseNormals = regReadBool('NR_MiscReverseNormals')
-
-    ImportAnything = regReadBool('NR_MiscImportAnything')
-
+    global g_duplicateMode
+    global g_printTimings
+    global g_backgroundImport
+    global g_importBatchSize
+
+    VertexLayout['autoMode'] = settingReadBool('NR_AutoMode', True)
+    InitialDirectory = settingReadString('InitialDirectory')
+
+    # VertexLayout['pos'][0] = settingReadDword('NR_VertexLayout_PosX')
+    # VertexLayout['pos'][2] = settingReadDword('NR_VertexLayout_PosY')
+    # VertexLayout['pos'][3] = settingReadDword('NR_VertexLayout_PosZ')
+
+    VertexLayout['nml'][0] = settingReadDword('NR_VertexLayout_NmlX', 3)
+    VertexLayout['nml'][1] = settingReadDword('NR_VertexLayout_NmlY', 4)
+    VertexLayout['nml'][2] = settingReadDword('NR_VertexLayout_NmlZ', 5)
+    VertexLayout['uvw'][0] = settingReadDword('NR_VertexLayout_TCU', 6)
+    VertexLayout['uvw'][1] = settingReadDword('NR_VertexLayout_TCV', 7)
+
+    mdlscaler = settingReadFloat('NR_TransformScale', 100.0)
+    g_ninjarotX = settingReadFloat('NR_TransformRotateX', 90.0)
+    g_ninjarotY = settingReadFloat('NR_TransformRotateY')
+    g_ninjarotZ = settingReadFloat('NR_TransformRotateZ')
+    uvscaler = settingReadFloat('NR_TransformUVScale', 1.0)
+
+    g_Tex0_FileLev = settingReadDword('NR_MiscTextureNumber')
+    g_flipUV = settingReadDword('NR_MiscFlipUV', 1)
+    g_normalizeUV = settingReadBool('NR_MiscNormalizeUV')
+    g_reverseNormals = settingReadBool('NR_MiscReverseNormals')
+
+    g_importNormals = settingReadBool('NR_MiscImportNormals', True)
+    g_importColors = settingReadBool('NR_MiscImportColors')
+    g_weldVertexes = settingReadBool('NR_MiscWeldVertexes', True)
+    g_cleanupMeshes = settingReadBool('NR_MiscCleanupMeshes', True)
+    g_combineMeshes = settingReadBool('NR_MiscCombineMeshes')
+    ImportAnything = settingReadBool('NR_MiscImportAnything')
+    g_duplicateMode = settingReadDword('NR_MiscDuplicates', 1)
+    g_printTimings = settingReadBool('NR_MiscPrintTimings')
+    g_backgroundImport = settingReadBool('NR_MiscBackgroundImport', True)
+    g_importBatchSize = settingReadDword('NR_MiscBatchSize', 8)
+
+
+def updateImportWindow():
     # cmds.intField(
     #    'NR_VertexLayout_PosX', edit=True, v=VertexLayout['pos'][0]
     # )
@@ -812,7 +1583,19 @@ def loadOptions():
 
     cmds.checkBox('NR_MiscNormalizeUV', edit=True, v=g_normalizeUV)
     cmds.checkBox('NR_MiscReverseNormals', edit=True, v=g_reverseNormals)
+    cmds.checkBox('NR_MiscImportNormals', edit=True, v=g_importNormals)
+    cmds.checkBox('NR_MiscImportColors', edit=True, v=g_importColors)
+    cmds.checkBox('NR_MiscWeldVertexes', edit=True, v=g_weldVertexes)
+    cmds.checkBox('NR_MiscCleanupMeshes', edit=True, v=g_cleanupMeshes)
+    cmds.checkBox('NR_MiscCombineMeshes', edit=True, v=g_combineMeshes)
     cmds.checkBox('NR_MiscImportAnything', edit=True, v=ImportAnything)
+    cmds.optionMenu('NR_MiscDuplicates', edit=True, sl=g_duplicateMode + 1)
+    cmds.checkBox('NR_MiscPrintTimings', edit=True, v=g_printTimings)
+    cmds.checkBox(
+        'NR_MiscBackgroundImport', edit=True, v=g_backgroundImport
+    )
+    cmds.intField('NR_MiscBatchSize', edit=True, v=g_importBatchSize)
+    cmds.checkBox('NR_MiscWatchFolder', edit=True, v=g_watchFolder)
 
     if VertexLayout['autoMode'] is True:
         cmds.radioButton('NR_VertexRecognitionAuto', edit=True, sl=True)
@@ -823,68 +1606,68 @@ def loadOptions():
 
 
 def saveOptions():
-    regSetBool("NR_AutoMode", VertexLayout['autoMode'])
-    regSetString("InitialDirectory", InitialDirectory)
-
-    # regSetDword("NR_VertexLayout_PosX", VertexLayout['pos'][0])
-    # regSetDword("NR_VertexLayout_PosY", VertexLayout['pos'][1])
-    # regSetDword("NR_VertexLayout_PosZ", VertexLayout['pos'][2])
-
-    regSetDword("NR_VertexLayout_NmlX", VertexLayout['nml'][0])
-    regSetDword("NR_VertexLayout_NmlY", VertexLayout['nml'][1])
-    regSetDword("NR_VertexLayout_NmlZ", VertexLayout['nml'][2])
-    regSetDword("NR_VertexLayout_TCU", VertexLayout['uvw'][0])
-    regSetDword("NR_VertexLayout_TCV", VertexLayout['uvw'][1])
-    regSetFloat("NR_TransformScale", mdlscaler)
-    regSetFloat("NR_TransformRotateX", g_ninjarotX)
-    regSetFloat("NR_TransformRotateY", g_ninjarotY)
-    regSetFloat("NR_TransformRotateZ", g_ninjarotZ)
-    regSetFloat("NR_TransformUVScale", uvscaler)
-    regSetDword("NR_MiscTextureNumber", g_Tex0_FileLev)
-    regSetDword("NR_MiscFlipUV", g_flipUV)
-    regSetBool("NR_MiscNormalizeUV", g_normalizeUV)
-    regSetBool("NR_MiscReverseNormals", g_reverseNormals)
-    regSetBool('NR_MiscImportAnything', ImportAnything)
-
-
-def setupRegister():
-    global RegisterKey
-    try:
-        RegisterKey = reg.OpenKey(
-            reg.HKEY_CURRENT_USER,
-            "SOFTWARE\\Autodesk\\MayaPlugins\\NinjaRipperMayaImportTools",
-            0,
-            reg.KEY_ALL_ACCESS
-        )
-    except WindowsError:
-        RegisterKey = reg.CreateKey(
-            reg.HKEY_CURRENT_USER,
-            "SOFTWARE\\Autodesk\\MayaPlugins\\NinjaRipperMayaImportTools"
-        )
-        regSetBool("NR_AutoMode", True)
-        regSetString("InitialDirectory", "")
-        # regSetDword("NR_VertexLayout_PosX", 0)
-        # regSetDword("NR_VertexLayout_PosY", 1)
-        # regSetDword("NR_VertexLayout_PosZ", 2)
-        regSetDword("NR_VertexLayout_NmlX", 3)
-        regSetDword("NR_VertexLayout_NmlY", 4)
-        regSetDword("NR_VertexLayout_NmlZ", 5)
-        regSetDword("NR_VertexLayout_TCU", 6)
-        regSetDword("NR_VertexLayout_TCV", 7)
-        regSetFloat("NR_TransformScale", 100.0)
-        regSetFloat("NR_TransformRotateX", 90.0)
-        regSetFloat("NR_TransformRotateY", 0.0)
-        regSetFloat("NR_TransformRotateZ", 0.0)
-        regSetFloat("NR_TransformUVScale", 1.0)
-        regSetDword("NR_MiscTextureNumber", 0)
-        regSetDword("NR_MiscFlipUV", 0)
-        regSetBool("NR_MiscNormalizeUV", False)
-        regSetBool("NR_MiscReverseNormals", False)
-        regSetBool('NR_MiscImportAnything', False)
-
-
-createMenu()
-createImportWindow()
-setupRegister()
-loadOptions()
-printMessage("NinjaRipperMayaImportTools loaded successfully!")
+    settingSetBool("NR_AutoMode", VertexLayout['autoMode'])
+    settingSetString("InitialDirectory", InitialDirectory)
+
+    # settingSetDword("NR_VertexLayout_PosX", VertexLayout['pos'][0])
+    # settingSetDword("NR_VertexLayout_PosY", VertexLayout['pos'][1])
+    # settingSetDword("NR_VertexLayout_PosZ", VertexLayout['pos'][2])
+
+    settingSetDword("NR_VertexLayout_NmlX", VertexLayout['nml'][0])
+    settingSetDword("NR_VertexLayout_NmlY", VertexLayout['nml'][1])
+    settingSetDword("NR_VertexLayout_NmlZ", VertexLayout['nml'][2])
+    settingSetDword("NR_VertexLayout_TCU", VertexLayout['uvw'][0])
+    settingSetDword("NR_VertexLayout_TCV", VertexLayout['uvw'][1])
+    settingSetFloat("NR_TransformScale", mdlscaler)
+    settingSetFloat("NR_TransformRotateX", g_ninjarotX)
+    settingSetFloat("NR_TransformRotateY", g_ninjarotY)
+    settingSetFloat("NR_TransformRotateZ", g_ninjarotZ)
+    settingSetFloat("NR_TransformUVScale", uvscaler)
+    settingSetDword("NR_MiscTextureNumber", g_Tex0_FileLev)
+    settingSetDword("NR_MiscFlipUV", g_flipUV)
+    settingSetBool("NR_MiscNormalizeUV", g_normalizeUV)
+    settingSetBool("NR_MiscReverseNormals", g_reverseNormals)
+    settingSetBool('NR_MiscImportNormals', g_importNormals)
+    settingSetBool('NR_MiscImportColors', g_importColors)
+    settingSetBool('NR_MiscWeldVertexes', g_weldVertexes)
+    settingSetBool('NR_MiscCleanupMeshes', g_cleanupMeshes)
+    settingSetBool('NR_MiscCombineMeshes', g_combineMeshes)
+    settingSetBool('NR_MiscImportAnything', ImportAnything)
+    settingSetDword('NR_MiscDuplicates', g_duplicateMode)
+    settingSetBool('NR_MiscPrintTimings', g_printTimings)
+    settingSetBool('NR_MiscBackgroundImport', g_backgroundImport)
+    settingSetDword('NR_MiscBatchSize', g_importBatchSize)
+    getSettings().flush()
+
+
+def initialize():
+    # Parser and settings are loaded on first use, so importing the module
+    # from usersetup only adds the menu.
+    global core
+    global numpy
+    global VertexLayout
+    global Stats
+
+    if core is not None:
+        return
+
+    import numpy
+    import NinjaRipperCore as core
+    VertexLayout = core.newVertexLayout()
+    Stats = core.NoStats
+    loadOptions()
+
+
+def showImportWindow():
+    # The window is built on first use (and again after the module is
+    # reloaded, so it gets the new controls).
+    if core is None or not cmds.window('NR_ImportWindow', exists=True):
+        initialize()
+        createImportWindow()
+        updateImportWindow()
+    cmds.showWindow('NR_ImportWindow')
+
+
+if not cmds.about(batch=True):
+    createMenu()
+    printMessage("NinjaRipperMayaImportTools loaded successfully!")
@@ -0,0 +1,124 @@
+# Shared helpers: synthetic .rip files in a temporary folder and small
+# hand-made meshes.
+import os
+import os.path
+import shutil
+import struct
+import tempfile
+import unittest
+import numpy
+import NinjaRipperCore as core
+import NinjaRipperBenchmark as benchmark
+
+
+class RipTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def makeRip(self, name, vertexes=50, faces=20, layout='basic', seed=0):
+        path = os.path.join(self.directory, name)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        benchmark.makeSyntheticRip(path, vertexes, faces, layout, seed=seed)
+        return path
+
+    def writeRip(self, name, faces, vertexData, attributes):
+        path = os.path.join(self.directory, name)
+        core.writeRIPFile(path, faces, vertexData, attributes)
+        return path
+
+    def truncate(self, path, size):
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:size])
+        return path
+
+
+def decodePerVertex(path):
+    # The struct.unpack per vertex path the importer used before NumPy
+    # decoding. Returns positions, normals, u, v and packed colors (or None)
+    # as lists.
+    with open(path, "rb") as f:
+        header, layout, vertDict, attributes, textures, shaders = \
+            core.readRIPTables(f, core.newVertexLayout())
+        f.seek(header[2] * 12, os.SEEK_CUR)
+        positions, normals, u, v, colors = [], [], [], [], []
+        for i in range(header[3]):
+            data = struct.unpack(
+                '<' + vertDict, f.read(len(vertDict) * 4)
+            )
+            position = [0.0, 0.0, 0.0, 0.0]
+            for j in range(layout['posCount']):
+                position[j] = data[layout['pos'][j]]
+            positions.append(position)
+            normals.append([
+                data[layout['nml'][j]] for j in range(layout['nmlCount'])
+            ])
+            u.append(data[layout['uvw'][0]] if layout['uvwCount'] > 0 else 0)
+            v.append(
+                1 - (data[layout['uvw'][1]] if layout['uvwCount'] > 1 else 0)
+            )
+            if layout['clrCount'] == 1:
+                packed = data[layout['clr'][0]]
+                colors.append([(packed >> s & 255) / 255.0
+                               for s in (0, 8, 16, 24)])
+    return positions, normals, u, v, colors or None
+
+
+def makeMesh(faces, positions, u=None, v=None, normals=None, colors=None,
+             uvFaces=None, sourceFaces=None):
+    # RipMesh from plain lists; positions are xyz, w is 1.
+    positions = numpy.asarray(positions, dtype=numpy.float32)
+    count = len(positions)
+    positions = numpy.column_stack(
+        (positions, numpy.ones(count, numpy.float32))
+    )
+    if u is None:
+        u = numpy.arange(count) / float(max(count, 1))
+    if v is None:
+        v = numpy.zeros(count)
+    if normals is None:
+        normals = numpy.tile([0, 0, 1], (count, 1))
+
+    def indexes(values):
+        if values is None:
+            return None
+        return numpy.asarray(values, dtype=numpy.uint32)
+
+    def floats(values):
+        if values is None:
+            return None
+        return numpy.asarray(values, dtype=numpy.float32)
+
+    faces = indexes(faces)
+    header = (
+        core.RipSignature, core.RipFileVersion, len(faces) // 3, count,
+        0, 0, 0, 0
+    )
+    layout = core.ResolvedLayout(core.newVertexLayout())
+    return core.RipMesh(
+        "mesh.rip", header, layout, [], ["Texture_0.dds"], [], faces,
+        positions, floats(normals), floats(u), floats(v), floats(colors),
+        indexes(uvFaces), indexes(sourceFaces)
+    )
+
+
+def cornerValues(ripMesh):
+    # Per face vertex attributes, independent of how they are indexed.
+    uvFaces = ripMesh.faces if ripMesh.uvFaces is None else ripMesh.uvFaces
+    sourceFaces = ripMesh.faces if ripMesh.sourceFaces is None \
+        else ripMesh.sourceFaces
+    result = {
+        'positions': ripMesh.positions[ripMesh.faces],
+        'u': ripMesh.u[uvFaces],
+        'v': ripMesh.v[uvFaces],
+        'normals': ripMesh.normals[sourceFaces],
+    }
+    if ripMesh.colors is not None:
+        result['colors'] = ripMesh.colors[sourceFaces]
+    return result
@@ -0,0 +1,68 @@
+import json
+import os
+import os.path
+import numpy
+import NinjaRipperCore as core
+from tests.ripfixtures import RipTestCase
+
+
+class CatalogTest(RipTestCase):
+    def makeCapture(self):
+        # Mesh, SV_POSITION mesh, broken tables, truncated vertex data.
+        return [
+            self.makeRip("mesh.rip"),
+            self.makeRip("screen.rip", layout='svposition'),
+            self.truncate(self.makeRip("broken.rip"), 40),
+            self.truncate(self.makeRip("short.rip"), 700),
+        ]
+
+    def testFilter(self):
+        paths = self.makeCapture()
+        self.assertEqual(core.filterRIPFiles(paths), paths[:2])
+        self.assertEqual(
+            core.filterRIPFiles(paths, importAnything=True), paths[:2]
+        )
+
+    def testNon3DFile(self):
+        # Positions without texture coordinates, e.g. a depth pass.
+        vertexData = numpy.zeros(3, dtype=core.makeVertexDtype('fff'))
+        path = self.writeRip("depth.rip", [0, 1, 2], vertexData, [
+            ['POSITION', 0, 0, [0, 0, 0]],
+        ])
+        self.assertEqual(core.filterRIPFiles([path]), [])
+        self.assertEqual(
+            core.filterRIPFiles([path], importAnything=True), [path]
+        )
+
+    def testEntries(self):
+        paths = self.makeCapture()
+        files = core.updateCatalog(self.directory)
+        self.assertEqual(sorted(files), sorted(
+            os.path.basename(path) for path in paths
+        ))
+        entry = files["mesh.rip"]
+        self.assertEqual((entry['faces'], entry['vertexes']), (20, 50))
+        self.assertTrue(entry['is3DModel'] and entry['isComplete'])
+        self.assertFalse(files["short.rip"]['isComplete'])
+        self.assertFalse(files["broken.rip"]['isRIP'])
+
+    def testSavedCatalogIsReused(self):
+        paths = self.makeCapture()
+        core.updateCatalog(self.directory)
+        with open(os.path.join(self.directory, core.CatalogFileName)) as f:
+            saved = json.load(f)
+        self.assertEqual(len(saved['files']), len(paths))
+
+        # Entries of unchanged files come from the saved catalog.
+        readRIPInfo = core.readRIPInfo
+        scanned = []
+        core.readRIPInfo = lambda path, layout=None: (
+            scanned.append(path) or readRIPInfo(path, layout)
+        )
+        try:
+            core.updateCatalog(self.directory)
+            self.makeRip("mesh.rip", 60)
+            core.updateCatalog(self.directory)
+        finally:
+            core.readRIPInfo = readRIPInfo
+        self.assertEqual(scanned, [paths[0]])
@@ -0,0 +1,110 @@
+import os.path
+import numpy
+import NinjaRipperCore as core
+import NinjaRipperBenchmark as benchmark
+from tests.ripfixtures import RipTestCase, decodePerVertex
+
+
+class DecodeTest(RipTestCase):
+    def assertSameAsPerVertex(self, path, **options):
+        ripMesh = core.readRIPFile(path, **options)
+        positions, normals, u, v, colors = decodePerVertex(path)
+        numpy.testing.assert_allclose(ripMesh.positions, positions, 1e-6)
+        numpy.testing.assert_allclose(
+            ripMesh.normals, numpy.reshape(normals, ripMesh.normals.shape),
+            1e-6
+        )
+        numpy.testing.assert_allclose(ripMesh.u, u, 1e-6)
+        numpy.testing.assert_allclose(ripMesh.v, v, 1e-6, 1e-6)
+        if colors is not None:
+            numpy.testing.assert_allclose(ripMesh.colors, colors, 1e-6)
+        return ripMesh
+
+    def testLayoutsMatchPerVertexDecoding(self):
+        for layout in sorted(benchmark.Layouts):
+            path = self.makeRip(layout + ".rip", 300, 100, layout)
+            for mapFile in (True, False):
+                ripMesh = self.assertSameAsPerVertex(path, mapFile=mapFile)
+                self.assertTrue(ripMesh.isComplete())
+
+    def testChunkSizesMatchPerVertexDecoding(self):
+        path = self.makeRip("wide.rip", 100, 30, 'wide')
+        chunkSize = core.VertexChunkSize
+        try:
+            for size in (1, 7, 100, 1000):
+                core.VertexChunkSize = size
+                self.assertSameAsPerVertex(path, mapFile=False)
+        finally:
+            core.VertexChunkSize = chunkSize
+
+    def testPackedColors(self):
+        path = self.makeRip("wide.rip", 20, 5, 'wide')
+        ripMesh = self.assertSameAsPerVertex(path)
+        self.assertEqual(ripMesh.colors.shape, (20, 4))
+
+    def testIgnoredAttributesAreNotDecoded(self):
+        path = self.makeRip("wide.rip", 20, 5, 'wide')
+        layout = core.newVertexLayout()
+        layout['ignore'] = ['nml', 'clr']
+        ripMesh = core.readRIPFile(path, layout)
+        self.assertIsNone(ripMesh.colors)
+        self.assertEqual(ripMesh.normals.shape, (20, 0))
+        self.assertTrue(ripMesh.is3DModel() and ripMesh.isComplete())
+        numpy.testing.assert_array_equal(
+            ripMesh.positions, core.readRIPFile(path).positions
+        )
+
+    def testFaces(self):
+        path = self.makeRip("basic.rip", 40, 25)
+        ripMesh = core.readRIPFile(path)
+        self.assertEqual(ripMesh.faceCount(), 25)
+        self.assertLess(int(ripMesh.faces.max()), 40)
+
+    def testTruncatedVertexBlock(self):
+        path = self.makeRip("basic.rip", 40, 10)
+        self.truncate(path, os.path.getsize(path) - 50)
+        ripMesh = core.readRIPFile(path)
+        self.assertFalse(ripMesh.isComplete())
+        self.assertEqual(ripMesh.vertexCount(), 40 - 2)
+
+    def testTruncatedTables(self):
+        path = self.truncate(self.makeRip("basic.rip"), 40)
+        self.assertRaises(core.RipFormatError, core.readRIPFile, path)
+
+    def testLayoutOutsideVertex(self):
+        vertexData = numpy.zeros(4, dtype=core.makeVertexDtype('fff'))
+        path = self.writeRip("outside.rip", [0, 1, 2], vertexData, [
+            ['POSITION', 0, 40, [0, 0, 0]],
+        ])
+        self.assertRaises(core.RipFormatError, core.readRIPFile, path)
+
+    def testBatchGoesOnPastBrokenFiles(self):
+        # A recognized attribute wider than the layout: 5 dword TEXCOORD.
+        vertexData = numpy.zeros(3, dtype=core.makeVertexDtype('f' * 8))
+        wide = self.writeRip("wide.rip", [0, 1, 2], vertexData, [
+            ['POSITION', 0, 0, [0, 0, 0]],
+            ['TEXCOORD', 0, 12, [0, 0, 0, 0, 0]],
+        ])
+        self.assertRaises(core.RipFormatError, core.readRIPFile, wide)
+
+        paths = [
+            wide,
+            self.makeRip("a.rip"),
+            self.truncate(self.makeRip("b.rip"), 40),
+            os.path.join(self.directory, "missing.rip"),
+            self.makeRip("c.rip"),
+        ]
+        results = list(core.readRIPFiles(paths, workers=2))
+        self.assertEqual([r[0] for r in results], paths)
+        self.assertEqual(
+            [r[1] is not None for r in results],
+            [False, True, False, False, True]
+        )
+        self.assertEqual(core.filterRIPFiles(paths), [paths[1], paths[4]])
+
+    def testSharedLayouts(self):
+        first = core.readRIPFile(self.makeRip("a.rip", seed=1))
+        second = core.readRIPFile(self.makeRip("b.rip", seed=2))
+        self.assertIs(first.layout, second.layout)
+        self.assertRaises(TypeError, first.layout.update, {})
+
@@ -0,0 +1,82 @@
+# The importer against the stub Maya modules of the benchmark: which files
+# become meshes and whether the arrays handed to MFnMesh fit together.
+import os.path
+import NinjaRipperCore as core
+import NinjaRipperBenchmark as benchmark
+from tests.ripfixtures import RipTestCase
+
+
+class MayaImportTest(RipTestCase):
+    def setUp(self):
+        RipTestCase.setUp(self)
+        self.maya = benchmark.importMayaModule()
+        self.saved = dict(
+            (name, getattr(self.maya, name)) for name in (
+                'ImportToMaya', 'g_meshCacheDirectory', 'g_combineMeshes',
+                'g_weldVertexes', 'g_cleanupMeshes', 'g_duplicateMode'
+            )
+        )
+        self.maya.g_meshCacheDirectory = os.path.join(
+            self.directory, "cache"
+        )
+        self.meshes = []
+
+        def importToMaya(vertexArray, polygonConnects, uvArray,
+                         uvConnects=None, normals=None, colors=None):
+            self.meshes.append((
+                len(vertexArray), list(polygonConnects), len(uvArray[0]),
+                list(polygonConnects if uvConnects is None else uvConnects)
+            ))
+            return self.saved['ImportToMaya'](
+                vertexArray, polygonConnects, uvArray, uvConnects, normals,
+                colors
+            )
+        self.maya.ImportToMaya = importToMaya
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(self.maya, name, value)
+        RipTestCase.tearDown(self)
+
+    def assertMeshesFit(self):
+        for vertexes, faces, uvs, uvFaces in self.meshes:
+            self.assertEqual(len(faces), len(uvFaces))
+            self.assertEqual(len(faces) % 3, 0)
+            self.assertLess(max(faces), vertexes)
+            self.assertLess(max(uvFaces), uvs)
+
+    def testImport(self):
+        paths = [
+            self.makeRip("a.rip", seed=1),
+            self.truncate(self.makeRip("broken.rip"), 40),
+            self.makeRip("b.rip", 80, 40, 'wide', seed=2),
+        ]
+        for weld in (False, True):
+            del self.meshes[:]
+            self.maya.g_weldVertexes = weld
+            self.maya.g_duplicateMode = 0
+            imported = self.maya.importRipFiles(paths)
+            self.assertEqual(imported, [paths[0], paths[2]])
+            self.assertEqual(len(self.meshes), 2)
+            self.assertMeshesFit()
+
+    def testCombine(self):
+        paths = [self.makeRip("m{}.rip".format(i), seed=i) for i in range(3)]
+        self.maya.g_combineMeshes = True
+        self.assertEqual(self.maya.importRipFiles(paths), paths)
+        self.assertEqual(len(self.meshes), 1)
+        self.assertMeshesFit()
+        faces = sum(core.readRIPFile(path).faceCount() for path in paths)
+        self.assertLessEqual(len(self.meshes[0][1]), faces * 3)
+
+    def testDuplicatesAreNotRebuilt(self):
+        path = self.makeRip("a.rip")
+        copy = self.makeRip("copy.rip")
+        self.maya.g_duplicateMode = 2  # Skip.
+        self.maya.cmds.objExists = lambda name: True
+        try:
+            imported = self.maya.importRipFiles([path, copy])
+        finally:
+            del self.maya.cmds.objExists
+        self.assertEqual(imported, [path, copy])
+        self.assertEqual(len(self.meshes), 1)
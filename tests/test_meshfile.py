@@ -0,0 +1,98 @@
+import os
+import os.path
+import numpy
+import NinjaRipperCore as core
+from tests.ripfixtures import RipTestCase, makeMesh
+
+
+class MeshFileTest(RipTestCase):
+    def roundTrip(self, ripMesh, mapFile=True):
+        path = os.path.join(self.directory, "mesh" + core.MeshFileExtension)
+        core.writeRipMeshFile(path, ripMesh)
+        return core.readRIPFile(path, mapFile=mapFile)
+
+    def assertSameMesh(self, first, second):
+        for name in ('header', 'attributes', 'textures', 'shaders'):
+            self.assertEqual(
+                list(getattr(first, name)), list(getattr(second, name)), name
+            )
+        self.assertEqual(dict(first.layout), dict(second.layout))
+        for name in ('faces', 'positions', 'normals', 'u', 'v', 'colors',
+                     'uvFaces', 'sourceFaces'):
+            a, b = getattr(first, name), getattr(second, name)
+            self.assertEqual(a is None, b is None, name)
+            if a is not None:
+                self.assertEqual(a.dtype, b.dtype, name)
+                numpy.testing.assert_array_equal(a, b, name)
+
+    def testRoundTrip(self):
+        ripMesh = core.readRIPFile(self.makeRip("wide.rip", layout='wide'))
+        for mapFile in (True, False):
+            loaded = self.roundTrip(ripMesh, mapFile)
+            self.assertSameMesh(ripMesh, loaded)
+            self.assertTrue(loaded.isComplete())
+
+    def testRoundTripWelded(self):
+        ripMesh = makeMesh(
+            [0, 1, 2, 2, 1, 3],
+            [[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]]
+        )
+        core.weldRipMesh(ripMesh, 0.01, 0.01)
+        self.assertSameMesh(ripMesh, self.roundTrip(ripMesh))
+
+    def testArraysAreAligned(self):
+        ripMesh = core.readRIPFile(self.makeRip("basic.rip", 7, 3))
+        loaded = self.roundTrip(ripMesh)
+        for name in ('faces', 'positions', 'normals', 'u', 'v'):
+            address = getattr(loaded, name).__array_interface__['data'][0]
+            self.assertEqual(address % core.MeshFileAlignment, 0, name)
+
+    def testBrokenFiles(self):
+        path = os.path.join(self.directory, "mesh" + core.MeshFileExtension)
+        core.writeRipMeshFile(
+            path, core.readRIPFile(self.makeRip("basic.rip"))
+        )
+        self.truncate(path, os.path.getsize(path) - 10)
+        self.assertRaises(core.RipFormatError, core.readRIPFile, path)
+
+        with open(path, "wb") as f:
+            f.write(b"NOPE" + b"\0" * 64)
+        self.assertRaises(core.RipFormatError, core.readRIPFile, path)
+
+    def testCleanedMeshStaysComplete(self):
+        ripMesh = core.readRIPFile(self.makeRip("basic.rip", 100, 30))
+        core.cleanRipMesh(ripMesh)
+        self.assertLess(ripMesh.vertexCount(), 100)
+        self.assertTrue(self.roundTrip(ripMesh).isComplete())
+
+    def testCache(self):
+        path = self.makeRip("basic.rip")
+        cache = core.RipMeshCache(os.path.join(self.directory, "cache"), 1e9)
+        layout = core.newVertexLayout()
+        self.assertIsNone(cache.load(path, layout))
+
+        ripMesh = core.readRIPFile(path, layout, cache=cache)
+        cached = cache.load(path, layout)
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached.path, path)
+        self.assertSameMesh(ripMesh, cached)
+
+    def testCacheEviction(self):
+        directory = os.path.join(self.directory, "cache")
+        cache = core.RipMeshCache(directory, 1e9)
+        ripMeshes = [
+            core.readRIPFile(self.makeRip("m{}.rip".format(i), seed=i))
+            for i in range(12)
+        ]
+        cache.store(ripMeshes[0], None)
+        cache.maxSize = cache.totalSize * 5
+        for ripMesh in ripMeshes[1:]:
+            cache.store(ripMesh, None)
+
+        sizes = [
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)
+        ]
+        self.assertLessEqual(sum(sizes), cache.maxSize)
+        self.assertEqual(sum(sizes), cache.totalSize)
+        self.assertIsNotNone(cache.load(ripMeshes[-1].path, None))
@@ -0,0 +1,107 @@
+import unittest
+import numpy
+import NinjaRipperCore as core
+from tests.ripfixtures import cornerValues, makeMesh
+
+# Two triangles far apart with the same UVs, and a copy of the first one
+# (separate vertexes, same positions) with its own UVs: a UV seam.
+SeamPositions = [
+    [0, 0, 0], [1, 0, 0], [0, 1, 0],
+    [50, 50, 50], [51, 50, 50], [50, 51, 50],
+    [0, 0, 0], [1, 0, 0], [0, 1, 0],
+]
+SeamU = [0, 1, 0, 0, 1, 0, 0.5, 1, 0]
+SeamV = [0, 0, 1, 0, 0, 1, 0, 0, 1]
+
+
+class MeshOpsTest(unittest.TestCase):
+    def assertSameCorners(self, ripMesh, expected, faces=None):
+        # 'faces' - face numbers of 'expected' that should be left.
+        actual = cornerValues(ripMesh)
+        for name, values in expected.items():
+            if faces is not None:
+                values = values.reshape(-1, 3, *values.shape[1:])[faces]
+                values = values.reshape(-1, *values.shape[2:])
+            numpy.testing.assert_array_equal(actual[name], values, name)
+
+    def seamMesh(self):
+        return makeMesh(
+            numpy.arange(9), SeamPositions, SeamU, SeamV,
+            normals=numpy.arange(27).reshape(9, 3),
+            colors=numpy.arange(36).reshape(9, 4)
+        )
+
+    def testWeldKeepsCorners(self):
+        ripMesh = self.seamMesh()
+        expected = cornerValues(ripMesh)
+        core.weldRipMesh(ripMesh, 0.01, 0.01)
+        self.assertSameCorners(ripMesh, expected)
+        self.assertEqual(ripMesh.vertexCount(), 6)
+        self.assertEqual(ripMesh.faces.tolist(), [0, 1, 2, 3, 4, 5, 0, 1, 2])
+
+    def testWeldKeepsUVsOfDifferentVertexesApart(self):
+        ripMesh = self.seamMesh()
+        core.weldRipMesh(ripMesh, 0.01, 0.01)
+        # Same UVs far apart stay apart, the seam copy shares UVs only
+        # where they are equal on the same vertex.
+        self.assertEqual(
+            ripMesh.uvFaces.tolist(), [0, 1, 2, 3, 4, 5, 6, 1, 2]
+        )
+
+    def testCleanupDropsDegenerateFaces(self):
+        positions = [[i, i * i, 0] for i in range(10)]
+        positions[5] = positions[4]
+        ripMesh = makeMesh(
+            [2, 3, 6, 2, 2, 3, 4, 5, 6, 3, 6, 8, 1, 1, 1], positions,
+            colors=numpy.arange(40).reshape(10, 4)
+        )
+        expected = cornerValues(ripMesh)
+        self.assertEqual(core.cleanRipMesh(ripMesh), 3)
+        self.assertSameCorners(ripMesh, expected, [0, 3])
+        self.assertEqual(ripMesh.faces.tolist(), [0, 1, 2, 1, 2, 3])
+        self.assertEqual(ripMesh.vertexCount(), 4)
+        self.assertEqual(len(ripMesh.u), 4)
+        self.assertEqual(len(ripMesh.colors), 4)
+        self.assertTrue(ripMesh.isComplete())
+
+    def testCleanupAfterWeld(self):
+        ripMesh = self.seamMesh()
+        ripMesh.faces = numpy.array(
+            [0, 1, 2, 3, 3, 4, 6, 7, 8], dtype=numpy.uint32
+        )
+        expected = cornerValues(ripMesh)
+        core.weldRipMesh(ripMesh, 0.01, 0.01)
+        self.assertEqual(core.cleanRipMesh(ripMesh), 1)
+        self.assertSameCorners(ripMesh, expected, [0, 2])
+        self.assertEqual(ripMesh.vertexCount(), 3)
+        self.assertEqual(len(ripMesh.normals), 6)
+
+    def testCleanupLeavesBrokenIndexes(self):
+        ripMesh = makeMesh([0, 1, 7], [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        self.assertEqual(core.cleanRipMesh(ripMesh), 0)
+        self.assertEqual(ripMesh.faces.tolist(), [0, 1, 7])
+
+    def testCombineKeepsCorners(self):
+        first = self.seamMesh()
+        core.weldRipMesh(first, 0.01, 0.01)
+        second = makeMesh([0, 1, 2], [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        expected = [cornerValues(first), cornerValues(second)]
+
+        combined, sources = core.combineRipMeshes([first, second])
+        self.assertEqual(combined.faceCount(), 4)
+        corners = cornerValues(combined)
+        for name in ('positions', 'u', 'v', 'normals'):
+            numpy.testing.assert_array_equal(
+                corners[name],
+                numpy.concatenate([e[name] for e in expected]), name
+            )
+        self.assertEqual(
+            [source[1:] for source in sources], [[0, 3, 0, 6], [3, 1, 6, 3]]
+        )
+
+    def testReverseWinding(self):
+        ripMesh = makeMesh([0, 1, 2], [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        ripMesh.normals.flags.writeable = False  # Like mapped arrays.
+        core.reverseWinding(ripMesh)
+        self.assertEqual(ripMesh.faces.tolist(), [0, 2, 1])
+        self.assertEqual(ripMesh.normals.tolist(), [[0, 0, -1]] * 3)